@@ -0,0 +1,19 @@
+"""Writing files so that readers never see half of one."""
+
+import os
+import tempfile
+
+
+def write_atomic(path, data):
+    """Writes `data` (str, as utf-8, or bytes) to a temporary file next to
+    `path`, then renames it, so that `path` never holds a partial result."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
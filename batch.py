@@ -0,0 +1,211 @@
+"""Batch conversion of many statutes at once.
+
+The manifest is a JSON Lines file (or a JSON list) with one item per
+statute:
+
+    {"source": "https://leginfo.legislature.ca.gov/faces/codes_displayText.xhtml?...",
+     "output": "out/ccpa.html",
+     "template": "index_template_general.html",
+     "law_info": {"label_hierarchy": ["lower", "arabic", "capital", "romanette", "roman"]}}
+
+`source` is a URL or a local .txt/.html file. `output`, `template` and
+`law_info` are optional; the defaults are a name derived from the source in
+the output directory, index_template_general.html and
+server.default_law_info.
+
+URLs are fetched by a pool of threads while a pool of processes does the
+parsing, so the network and the CPU-bound stages overlap. Each output is
+written atomically (derived names that clash get a counter, and items that
+share an explicit output fail), and a summary line is printed per item. With `store`
+(the path of a store.StageStore), the pages and stages of every item are
+kept there, and a rerun only parses what changed; URLs whose page was stored
+less than `store_max_age` seconds ago (ever, if None) aren't fetched again.
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import re
+import time
+
+import server
+from atomic import write_atomic
+
+
+DEFAULT_TEMPLATE = "index_template_general.html"
+
+
+def read_manifest(path):
+    with open(path) as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def output_name(source):
+    """A file name for the output of `source`, e.g. "ccpa.html" for ccpa.txt
+    or "division_7_chapter_3_5_lawCode_GOV_title_1_article_1.html" for a
+    leginfo URL."""
+    if source.startswith("http"):
+        name = source.split("?", 1)[-1]
+    else:
+        name = os.path.splitext(os.path.basename(source))[0]
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") + ".html"
+
+
+def output_paths(items, out_dir):
+    """The output path of each item, and an error (or None) for each.
+
+    Derived names that clash, e.g. for a.txt and a.html, get a counter
+    ("a_2.html"). An explicit output that more than one item has is an error
+    for each of them, rather than one output silently replacing the other.
+    """
+    taken = collections.Counter(
+        os.path.abspath(item["output"]) for item in items if item.get("output")
+    )
+    paths = []
+    errors = []
+    for item in items:
+        output = item.get("output")
+        if output:
+            count = taken[os.path.abspath(output)]
+            paths.append(output)
+            errors.append(f"{count} items have the output {output}" if count > 1 else None)
+            continue
+
+        base, extension = os.path.splitext(os.path.join(out_dir, output_name(item["source"])))
+        output = base + extension
+        counter = 1
+        while os.path.abspath(output) in taken:
+            counter += 1
+            output = f"{base}_{counter}{extension}"
+        taken[os.path.abspath(output)] += 1
+        paths.append(output)
+        errors.append(None)
+    return paths, errors
+
+
+def convert(source, html_content, law_info, template, output, store=None):
+    """Runs in a worker process. `html_content` is the already fetched page
+    for URLs, None for local files (and URLs whose page is in `store`).
+    Returns (seconds, bytes written)."""
+    start = time.perf_counter()
+    law_info = server.load_law_info(law_info)
+    if store is not None:
+        import store as store_module
+
+        html = store_module.convert(store, source, html_content, law_info, template)
+    elif html_content is None:
+        html = server.format_statute(source, law_info, template, output)
+    else:
+        filtered_statute = server.filter_html(html_content)
+        html = server.render_statute(filtered_statute, law_info, template)
+    write_atomic(output, html)
+    return time.perf_counter() - start, len(html.encode("utf-8"))
+
+
+def fetch(source, http_cache=None, store=None, store_max_age=None):
+    """Returns (page, seconds). The page is None if `store` has a recent
+    enough one."""
+    start = time.perf_counter()
+    if store is not None:
+        import store as store_module
+
+        if store_module.stored_page(store_module.open_store(store), source, store_max_age) is not None:
+            return None, time.perf_counter() - start
+    html_content = server.read_source(source, http_cache)
+    return html_content, time.perf_counter() - start
+
+
+def run_batch(
+    items,
+    out_dir=".",
+    workers=None,
+    fetchers=8,
+    store=None,
+    store_max_age=None,
+    http_cache=None,
+    report=print,
+):
+    """Converts every manifest item. Returns a list of result dicts with
+    source, output, fetch and parse seconds, bytes and error (or None).
+    URLs are fetched through `http_cache` (an http_cache.HTTPCache), if
+    given."""
+
+    results = []
+    for item, output, error in zip(items, *output_paths(items, out_dir)):
+        results.append({
+            "source": item["source"],
+            "output": output,
+            "fetch": 0.0,
+            "parse": 0.0,
+            "bytes": 0,
+            "error": error,
+        })
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as parsers, \
+            concurrent.futures.ThreadPoolExecutor(fetchers) as network:
+
+        parsing = {}
+        fetching = {}
+
+        def submit(i, html_content):
+            item = items[i]
+            future = parsers.submit(
+                convert,
+                item["source"],
+                html_content,
+                item.get("law_info"),
+                item.get("template", DEFAULT_TEMPLATE),
+                results[i]["output"],
+                store,
+            )
+            parsing[future] = i
+            return future
+
+        pending = set()
+        for i, item in enumerate(items):
+            if results[i]["error"]:
+                report(summary_line(results[i]))
+            elif item["source"].startswith("http"):
+                future = network.submit(fetch, item["source"], http_cache, store, store_max_age)
+                fetching[future] = i
+                pending.add(future)
+            else:
+                pending.add(submit(i, None))
+
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future in fetching:
+                    # Parsing starts on each page as soon as it arrives.
+                    i = fetching[future]
+                    try:
+                        html_content, results[i]["fetch"] = future.result()
+                    except Exception as e:
+                        results[i]["error"] = f"fetch failed: {e!r}"
+                        report(summary_line(results[i]))
+                    else:
+                        pending.add(submit(i, html_content))
+                else:
+                    i = parsing[future]
+                    try:
+                        results[i]["parse"], results[i]["bytes"] = future.result()
+                    except Exception as e:
+                        results[i]["error"] = repr(e)
+                    report(summary_line(results[i]))
+
+    return results
+
+
+def summary_line(result):
+    if result["error"]:
+        return f"ERROR {result['source']}: {result['error']}"
+    return (
+        f"ok    {result['output']}  fetch {result['fetch']:.2f}s"
+        f"  parse {result['parse']:.2f}s  {result['bytes']:,} bytes"
+    )
@@ -0,0 +1,199 @@
+"""Synthetic statutes for the benchmarks.
+
+`generate()` writes a leginfo-style html page and the matching .txt version
+of a made-up statute, along with the law_info to parse it with. The knobs:
+
+    sections        number of sections (law headings)
+    depth           how many levels of the label hierarchy are used (1-5)
+    breadth         most provisions under each label
+    collisions      chance that a list of lower-case labels runs on past (h),
+                    so that (i), (v) and (x) collide with romanettes
+    subsections     chance that a provision starts inline with its first child,
+                    e.g. "(b) (1) text", or "(b) (1) (A) text" (one in three)
+    term_density    chance that each word of text is a defined term
+    seed            for the random choices
+
+    python benchmarks/generate.py out/statute --sections 500 --depth 4
+"""
+
+import argparse
+import html
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from labels import LABELS  # noqa: E402
+
+
+LABEL_HIERARCHY = ["lower", "arabic", "capital", "romanette", "roman"]
+
+WORDS = (
+    "a consumer shall have the right to request that any entity disclose "
+    "the categories and specific pieces of data it has collected except as "
+    "provided in this section and subject to the requirements of law"
+).split()
+
+SUPERTERMS = {
+    "personal information": "#1798.140(v)",
+    "service provider": "#1798.140(ag)",
+    "business purpose": "#1798.140(e)",
+}
+
+SUBTERMS = {
+    "business": "#1798.140(d)",
+    "consumer": "#1798.140(i)",
+    "sell": "#1798.140(ad)",
+}
+
+TERMS = list(SUPERTERMS) + list(SUBTERMS)
+
+
+def law_info():
+    return {
+        "label_hierarchy": dict(enumerate(LABEL_HIERARCHY)),
+        "section_regex": r"(1798\.\d+\.?)",
+        "title": "Synthetic Privacy Act",
+        "defined_superterms": dict(SUPERTERMS),
+        "defined_subterms": dict(SUBTERMS),
+    }
+
+
+class Generator:
+    def __init__(self, depth=4, breadth=4, collisions=0.2, subsections=0.1, term_density=0.05, seed=0):
+        self.depth = max(1, min(depth, len(LABEL_HIERARCHY)))
+        self.breadth = breadth
+        self.collisions = collisions
+        self.subsections = subsections
+        self.term_density = term_density
+        self.random = random.Random(seed)
+
+    def text(self, words=12):
+        out = []
+        for _ in range(words):
+            if self.random.random() < self.term_density:
+                out.append(self.random.choice(TERMS))
+            else:
+                out.append(self.random.choice(WORDS))
+        if self.random.random() < 0.1:
+            out.append(f"pursuant to Section 1798.{self.random.randint(100, 199)}")
+        return " ".join(out) + "."
+
+    def children(self, level):
+        """How many labels to put in a list at `level`."""
+        if level == 0 and self.random.random() < self.collisions:
+            # Far enough to reach (i), and often (v) and (x) too.
+            return self.random.randint(9, 24)
+        if LABEL_HIERARCHY[level] == "romanette" and self.random.random() < self.collisions:
+            return self.random.randint(4, 12)
+        return self.random.randint(1, self.breadth)
+
+    def provisions(self, level=0):
+        """Yields (level, labels, text) for a list of provisions at `level`
+        and everything under them. `labels` has more than one label when
+        children start inline."""
+
+        for ordinal in range(1, self.children(level) + 1):
+            label = f"({LABELS.label(LABEL_HIERARCHY[level], ordinal)})"
+            nested = level + 1 < self.depth and self.random.random() < 0.5
+
+            if not nested:
+                yield level, [label], self.text()
+                continue
+
+            below = list(self.provisions(level + 1))
+            if self.random.random() < self.subsections and len(below[0][1]) == 1:
+                # "(b) (1) text", or "(b) (1) (A) text" if (1) has children.
+                first_level, first_labels, first_text = below.pop(0)
+                labels = [label] + first_labels
+                if (
+                    below
+                    and below[0][0] == first_level + 1
+                    and len(below[0][1]) == 1
+                    and self.random.random() < 1 / 3
+                ):
+                    _, second_labels, first_text = below.pop(0)
+                    labels += second_labels
+                yield level, labels, first_text
+            else:
+                yield level, [label], self.text()
+            yield from below
+
+    def statute(self, sections):
+        """Yields the lines of the statute as (kind, level, text)."""
+        yield "bill", 0, "SECTION 1."
+        yield "title", 0, "TITLE 1.81.5"
+        yield "article", 0, "Article 1. Synthetic Privacy Act"
+        for number in range(sections):
+            yield "section", 0, f"1798.{100 + number}."
+            yield "intro", 0, self.text(20)
+            for level, labels, text in self.provisions():
+                yield "provision", level, " ".join(labels + [text])
+
+
+def to_html(lines):
+    out = ["<html><body>"]
+    tags = {"bill": "h3", "title": "h4", "article": "h5", "section": "h6"}
+    for kind, level, text in lines:
+        text = html.escape(text, quote=False)
+        if kind in tags:
+            out.append(f"<{tags[kind]}>{text}</{tags[kind]}>")
+        elif kind == "intro":
+            out.append(f'<p style="margin:0;display:inline;">{text}</p>')
+        else:
+            out.append(f'<p style="margin-left: {level + 1}em">{text}</p>')
+    out.append("</body></html>")
+    return "\n".join(out) + "\n"
+
+
+def to_txt(lines):
+    out = []
+    for kind, _, text in lines:
+        if kind == "bill":
+            text = "SECTION 1. The people enact:"
+        out.append(text)
+    return "\n".join(out) + "\n"
+
+
+def generate(path, sections=100, **knobs):
+    """Writes `path`.html and `path`.txt. Returns (html path, txt path,
+    law_info)."""
+    lines = list(Generator(**knobs).statute(sections))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.html", "w", encoding="utf-8") as f:
+        f.write(to_html(lines))
+    with open(f"{path}.txt", "w", encoding="utf-8") as f:
+        f.write(to_txt(lines))
+    return f"{path}.html", f"{path}.txt", law_info()
+
+
+def add_knobs(parser):
+    parser.add_argument("--depth", type=int, default=4, help="levels of labels used (1-5)")
+    parser.add_argument("--breadth", type=int, default=4, help="most labels in a list")
+    parser.add_argument("--collisions", type=float, default=0.2, help="chance of i/v/x collisions")
+    parser.add_argument("--subsections", type=float, default=0.1, help="chance of inline double/triple subsections")
+    parser.add_argument("--term-density", type=float, default=0.05, help="chance of each word being a defined term")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def knobs(args):
+    return {
+        "depth": args.depth,
+        "breadth": args.breadth,
+        "collisions": args.collisions,
+        "subsections": args.subsections,
+        "term_density": args.term_density,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", help="writes PATH.html and PATH.txt")
+    parser.add_argument("--sections", type=int, default=100)
+    add_knobs(parser)
+    args = parser.parse_args()
+    html_path, txt_path, _ = generate(args.path, args.sections, **knobs(args))
+    print(html_path, txt_path)
@@ -0,0 +1,164 @@
+"""Times each stage of the pipeline on synthetic statutes of growing size.
+
+    python benchmarks/run.py --sizes 50,200,1000 --out results.json
+    python benchmarks/run.py --compare results.json --out new.json
+
+For each size a statute is generated (see generate.py) and these are timed
+separately, each on the output of the stage before:
+
+    filter_html, filter_txt, extract_labels, indent_statute, hyperlink,
+    format_statute (html and txt, end to end, without the render cache)
+
+Each stage runs --repeat times; the best and median seconds are recorded,
+along with the sizes involved. --compare prints the ratio of each best time to
+the same stage and size in an earlier results file.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+
+
+TEMPLATE = "index_template_general.html"
+
+
+def timed(function, repeat):
+    """Returns (result of the last run, list of seconds per run)."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def bench_size(sections, directory, repeat, knobs):
+    html_path, txt_path, law_info = generate.generate(
+        os.path.join(directory, f"statute_{sections}"), sections, **knobs
+    )
+    with open(html_path, encoding="utf-8") as f:
+        html_content = f.read()
+
+    stages = {}
+
+    def record(name, function):
+        result, times = timed(function, repeat)
+        stages[name] = {"best": min(times), "median": statistics.median(times)}
+        return result
+
+    filtered = record("filter_html", lambda: server.filter_html(html_content))
+    record("filter_txt", lambda: server.filter_txt(txt_path, law_info))
+    provisions = record("extract_labels", lambda: server.extract_labels(filtered, law_info))
+    indented = record("indent_statute", lambda: server.indent_statute(filtered, law_info))
+    new_html = record("hyperlink", lambda: server.hyperlink(indented, law_info))
+    output = record(
+        "format_statute_html",
+        lambda: server.format_statute(
+            html_path, law_info, TEMPLATE, None, http_cache=None, render_cache=None
+        ),
+    )
+    record(
+        "format_statute_txt",
+        lambda: server.format_statute(
+            txt_path, law_info, TEMPLATE, None, http_cache=None, render_cache=None
+        ),
+    )
+
+    return {
+        "sections": sections,
+        "html_bytes": os.path.getsize(html_path),
+        "txt_bytes": os.path.getsize(txt_path),
+        "lines": len(filtered),
+        "provisions": len(provisions),
+        "indent_errors": sum(1 for line in indented if line[0] == "INDENTERROR"),
+        "html_lines": len(new_html),
+        "output_bytes": len(output.encode("utf-8")),
+        "stages": stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    """Lines with the ratio of each best time to the previous run's."""
+    before = {
+        (size["sections"], stage): timing["best"]
+        for size in previous["sizes"]
+        for stage, timing in size["stages"].items()
+    }
+    lines = []
+    for size in results["sizes"]:
+        for stage, timing in size["stages"].items():
+            old = before.get((size["sections"], stage))
+            if old:
+                lines.append(
+                    f"{size['sections']:>7} {stage:<22} {old:9.4f}s -> {timing['best']:9.4f}s"
+                    f"  x{timing['best'] / old:.2f}"
+                )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="50,200,1000", help="comma-separated numbers of sections")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="an earlier results file")
+    generate.add_knobs(parser)
+    args = parser.parse_args(argv)
+
+    out = os.path.abspath(args.out)
+    previous = os.path.abspath(args.compare) if args.compare else None
+
+    # format_statute() finds templates relative to the working directory.
+    os.chdir(ROOT)
+
+    results = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "generator": generate.knobs(args),
+        "sizes": [],
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        for sections in (int(size) for size in args.sizes.split(",")):
+            size = bench_size(sections, directory, args.repeat, generate.knobs(args))
+            results["sizes"].append(size)
+            print(f"{sections} sections, {size['lines']} lines, {size['html_bytes']:,} html bytes")
+            for stage, timing in size["stages"].items():
+                print(f"    {stage:<22} {timing['best']:9.4f}s best  {timing['median']:9.4f}s median")
+
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if previous:
+        with open(previous) as f:
+            print("\n".join(compare(results, json.load(f))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Times cold starts: each run is a new interpreter, as in a batch job or a
+serverless invocation.
+
+    python benchmarks/startup.py --repeat 10 --budget 150 --out startup.json
+
+Scenarios:
+
+    python          the interpreter alone, for reference
+    import_server   `import server`
+    convert_txt     main.py convert of a small generated .txt statute
+    convert_html    main.py convert of the same statute as a local .html file
+
+For each, the best and median milliseconds are recorded, along with the
+heavy modules (requests, bs4, ...) the scenario imported; the text path
+shouldn't import any. With --budget, exits with status 1 if the median
+convert_txt time is over that many milliseconds or if the text path imports
+a heavy module.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate  # noqa: E402
+
+
+HEAVY_MODULES = ("requests", "bs4", "urllib3", "charset_normalizer", "soupsieve", "pprint", "copy")
+
+# Runs `script` the way main.py would, then reports the heavy modules loaded.
+RUNNER = """
+import json, runpy, sys
+sys.argv = {argv!r}
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted(m for m in {heavy!r} if m in sys.modules)), file=sys.stderr)
+"""
+
+
+def scenarios(directory):
+    html_path, txt_path, law_info = generate.generate(os.path.join(directory, "statute"), 20)
+    law_info_path = os.path.join(directory, "law_info.json")
+    with open(law_info_path, "w") as f:
+        json.dump(law_info, f)
+    main_py = os.path.join(ROOT, "main.py")
+
+    def convert(source):
+        argv = [main_py, "convert", source, os.path.join(directory, "out.html"), "--law-info", law_info_path]
+        return RUNNER.format(argv=argv, script=main_py, heavy=HEAVY_MODULES)
+
+    return {
+        "python": "pass",
+        "import_server": (
+            "import json, sys, server\n"
+            f"print(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)), file=sys.stderr)"
+        ),
+        "convert_txt": convert(txt_path),
+        "convert_html": convert(html_path),
+    }
+
+
+def cold_start(code):
+    """Returns (seconds, heavy modules imported) for one new interpreter."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    seconds = time.perf_counter() - start
+    last_line = completed.stderr.strip().splitlines()[-1:] or ["[]"]
+    return seconds, json.loads(last_line[0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=None, help="milliseconds allowed for convert_txt")
+    parser.add_argument("--out", default=None, help="write the results as json")
+    args = parser.parse_args(argv)
+
+    results = {"python": sys.version.split()[0], "repeat": args.repeat, "scenarios": {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, code in scenarios(directory).items():
+            times = []
+            for _ in range(args.repeat):
+                seconds, heavy = cold_start(code)
+                times.append(seconds * 1000)
+            results["scenarios"][name] = {
+                "best_ms": min(times),
+                "median_ms": statistics.median(times),
+                "heavy_modules": heavy,
+            }
+            print(
+                f"{name:<14} {min(times):8.1f}ms best  {statistics.median(times):8.1f}ms median"
+                f"  {' '.join(heavy) or '-'}"
+            )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.budget is not None:
+        txt = results["scenarios"]["convert_txt"]
+        if txt["median_ms"] > args.budget or txt["heavy_modules"]:
+            print(
+                f"over budget: convert_txt {txt['median_ms']:.1f}ms (budget {args.budget:.0f}ms),"
+                f" heavy modules: {' '.join(txt['heavy_modules']) or 'none'}"
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Line classification for extract_labels().
+
+A paragraph line may start with a parenthetical label such as "(a)", "(2)",
+"(B)", "(iv)" or "(IV)". `LINE_CLASSIFIER` reports every label type the
+label could be and splits the line into label and text, in a single scan of
+one compiled pattern.
+"""
+
+import re
+
+
+# Label types in the order they are reported. Each pattern must match the
+# whole label (the part between the parentheses).
+LABEL_PATTERNS = {
+    "lower": r"[a-z]{1,3}",
+    "arabic": r"[\d]{1,2}",
+    "capital": r"[A-Z]{1,3}",
+    "roman": r"M{0,4}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3})",
+    "romanette": r"m{0,4}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})",
+}
+
+
+class LineClassifier:
+    """Compiled once and shared by every document.
+
+    Each label type is an optional lookahead anchored just after the opening
+    parenthesis, so all of them are tried at the same position, followed by
+    the generic label/text split.
+    """
+
+    def __init__(self, label_patterns=LABEL_PATTERNS):
+        self.label_types = list(label_patterns)
+        lookaheads = "".join(
+            rf"(?:(?=(?P<{label_type}>{pattern})\)))?"
+            for label_type, pattern in label_patterns.items()
+        )
+        self.pattern = re.compile(
+            rf"\({lookaheads}(?:(?P<label>.{{1,5}})\)(?P<text>.*))?"
+        )
+
+    def classify(self, line):
+        """Returns (label types, label, text).
+
+        label and text are None if the line doesn't start with a label of at
+        most five characters.
+        """
+        match = self.pattern.match(line)
+        if match is None:
+            return [], None, None
+
+        groups = match.groupdict()
+        label_types = [
+            label_type
+            for label_type in self.label_types
+            if groups[label_type] is not None
+        ]
+        return label_types, groups["label"], groups["text"]
+
+
+LINE_CLASSIFIER = LineClassifier()
@@ -0,0 +1,329 @@
+"""Crawling whole codes from leginfo.
+
+Starting from a code's table of contents, e.g.
+
+    https://leginfo.legislature.ca.gov/faces/codesTOCSelected.xhtml?tocCode=GOV
+
+the crawler follows the links to the expanded branches of the outline and
+collects every codes_displayText.xhtml page (one per article), which is
+converted as soon as it arrives, by a pool of processes, as in batch.py.
+
+Pages are fetched by `concurrency` threads over one pooled session, through
+an HTTPCache, with at least `delay` seconds between the start of any two
+requests to the site. Progress is checkpointed to a json state file (the
+pages discovered so far and the ones finished), so an interrupted crawl picks
+up where it left off when it is run again with the same state file.
+
+For testing without the real site, `record_dir` saves every page fetched, and
+`RecordedSite` serves such a directory locally, so that
+
+    site = RecordedSite("recorded/")
+    Crawler(site.url_for(start_url), "state.json", "out/", delay=0, cache_dir=tmp).run()
+
+crawls the recorded pages instead.
+"""
+
+import collections
+import concurrent.futures
+import html.parser
+import http.server
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+
+import batch
+from http_cache import DEFAULT_CACHE_DIR, HTTPCache
+
+
+BRANCH_PAGE = re.compile(r"/(codesTOCSelected|codes_displayexpandedbranch)\.xhtml$")
+LEAF_PAGE = re.compile(r"/codes_displayText\.xhtml$")
+
+STATE_VERSION = 1
+
+
+class LinkParser(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+
+def page_links(base_url, page):
+    """The absolute URLs (without fragments) of the links in `page`."""
+    parser = LinkParser()
+    parser.feed(page)
+    parser.close()
+    return [urllib.parse.urldefrag(urllib.parse.urljoin(base_url, href))[0] for href in parser.links]
+
+
+class RateLimiter:
+    """Spaces out calls to wait() by at least `delay` seconds, across threads."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+
+class PoliteSession:
+    """A requests session whose requests wait their turn at a RateLimiter.
+    Only requests that reach the network wait; cache hits don't."""
+
+    def __init__(self, session, limiter):
+        self.session = session
+        self.limiter = limiter
+
+    def get(self, url, **kwargs):
+        self.limiter.wait()
+        return self.session.get(url, **kwargs)
+
+
+def pooled_session(connections):
+    # Only a crawl needs requests, not RecordedSite or the state.
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CrawlState:
+    """What has been discovered and finished, saved as json."""
+
+    def __init__(self, path, start_url):
+        self.path = path
+        self.start_url = start_url
+        # url -> "branch" or "leaf", in the order found
+        self.discovered = {start_url: "branch"}
+        # url -> output path (leaves) or None (branches)
+        self.done = {}
+        # url -> error
+        self.failed = {}
+
+    @classmethod
+    def load(cls, path, start_url):
+        """The saved state at `path`, or a new one if there is none (or it is
+        for a different crawl)."""
+        state = cls(path, start_url)
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return state
+        if saved.get("version", 0) > STATE_VERSION:
+            raise ValueError(f"crawl state version {saved['version']} is newer than {STATE_VERSION}")
+        if saved["start_url"] != start_url:
+            return state
+        state.discovered = dict(saved["discovered"])
+        state.done = dict(saved["done"])
+        # Failed pages are tried again.
+        return state
+
+    def pending(self):
+        return [(url, kind) for url, kind in self.discovered.items() if url not in self.done]
+
+    def save(self):
+        batch.write_atomic(
+            self.path,
+            json.dumps(
+                {
+                    "version": STATE_VERSION,
+                    "start_url": self.start_url,
+                    "discovered": list(self.discovered.items()),
+                    "done": self.done,
+                    "failed": self.failed,
+                },
+                indent=1,
+            ),
+        )
+
+
+class Crawler:
+    def __init__(
+        self,
+        start_url,
+        state_path,
+        out_dir,
+        concurrency=4,
+        delay=1.0,
+        workers=None,
+        law_info=None,
+        template=batch.DEFAULT_TEMPLATE,
+        cache_dir=DEFAULT_CACHE_DIR,
+        ttl=3600,
+        record_dir=None,
+        checkpoint_every=10,
+        report=print,
+    ):
+        self.start_url = start_url
+        self.host = urllib.parse.urlsplit(start_url).netloc
+        self.out_dir = out_dir
+        self.concurrency = concurrency
+        self.workers = workers
+        self.law_info = law_info
+        self.template = template
+        self.record_dir = record_dir
+        self.checkpoint_every = checkpoint_every
+        self.report = report
+        self.state = CrawlState.load(state_path, start_url)
+
+        session = PoliteSession(pooled_session(concurrency), RateLimiter(delay))
+        self.http_cache = HTTPCache(directory=cache_dir, ttl=ttl, session=session)
+
+    def fetch(self, url):
+        page = self.http_cache.get(url)
+        if self.record_dir is not None:
+            batch.write_atomic(os.path.join(self.record_dir, recorded_name(url)), page)
+        return page
+
+    def classify(self, url):
+        """"branch", "leaf" or None for links not to follow."""
+        parts = urllib.parse.urlsplit(url)
+        if parts.netloc != self.host:
+            return None
+        if LEAF_PAGE.search(parts.path):
+            return "leaf"
+        if BRANCH_PAGE.search(parts.path):
+            return "branch"
+        return None
+
+    def run(self):
+        """Crawls until every discovered page is done. Returns the state."""
+
+        state = self.state
+        queue = collections.deque(state.pending())
+        since_checkpoint = 0
+
+        with concurrent.futures.ProcessPoolExecutor(self.workers) as parsers, \
+                concurrent.futures.ThreadPoolExecutor(self.concurrency) as network:
+
+            fetching = {}
+            parsing = {}
+
+            def fill():
+                # At most `concurrency` fetches are in flight, so the queue
+                # (and the checkpoint) stays accurate.
+                while queue and len(fetching) < self.concurrency:
+                    url, kind = queue.popleft()
+                    fetching[network.submit(self.fetch, url)] = (url, kind)
+
+            fill()
+            try:
+                while fetching or parsing:
+                    done, _ = concurrent.futures.wait(
+                        list(fetching) + list(parsing),
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        if future in fetching:
+                            url, kind = fetching.pop(future)
+                            try:
+                                page = future.result()
+                            except Exception as e:
+                                state.failed[url] = f"fetch failed: {e!r}"
+                                self.report(f"ERROR {url}: {state.failed[url]}")
+                                continue
+
+                            if kind == "branch":
+                                for link in page_links(url, page):
+                                    link_kind = self.classify(link)
+                                    if link_kind and link not in state.discovered:
+                                        state.discovered[link] = link_kind
+                                        queue.append((link, link_kind))
+                                state.done[url] = None
+                                since_checkpoint += 1
+                            else:
+                                output = os.path.join(self.out_dir, batch.output_name(url))
+                                parsing[parsers.submit(
+                                    batch.convert, url, page, self.law_info, self.template, output
+                                )] = (url, output)
+                        else:
+                            url, output = parsing.pop(future)
+                            try:
+                                seconds, size = future.result()
+                            except Exception as e:
+                                state.failed[url] = repr(e)
+                                self.report(f"ERROR {url}: {state.failed[url]}")
+                                continue
+                            state.done[url] = output
+                            state.failed.pop(url, None)
+                            since_checkpoint += 1
+                            self.report(f"ok    {output}  parse {seconds:.2f}s  {size:,} bytes")
+
+                    if since_checkpoint >= self.checkpoint_every:
+                        state.save()
+                        since_checkpoint = 0
+                    fill()
+            finally:
+                # Also on errors and ^C, so the next run resumes from here.
+                state.save()
+
+        return state
+
+
+def recorded_name(url):
+    """The file name of a recorded page: its path and query, quoted, so that
+    the same page is found whatever host serves it."""
+    parts = urllib.parse.urlsplit(url)
+    return urllib.parse.quote(f"{parts.path}?{parts.query}", safe="") + ".html"
+
+
+class RecordedSite:
+    """Serves recorded pages on localhost, in a background thread. Absolute
+    links to the recorded host are rewritten to point here."""
+
+    def __init__(self, directory, recorded_host="https://leginfo.legislature.ca.gov", port=0):
+        site = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urllib.parse.urlsplit(self.path)
+                path = os.path.join(directory, recorded_name(f"http://host{parts.path}?{parts.query}"))
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        page = f.read()
+                except FileNotFoundError:
+                    self.send_error(404)
+                    return
+                body = page.replace(recorded_host, site.base_url).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url_for(self, url):
+        """`url` on this site instead of the recorded host."""
+        parts = urllib.parse.urlsplit(url)
+        return urllib.parse.urlunsplit(("http", self.base_url[len("http://"):], parts.path, parts.query, ""))
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
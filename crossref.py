@@ -0,0 +1,185 @@
+"""Cross-reference linking for hyperlink().
+
+References to other sections ("Section 1798.135(c)(2)(A)") are linked only
+to anchors that actually exist. `AnchorIndex` is the set of ids that
+indent_statute() output gets on the page: each section heading's number and
+each provision's full cite, e.g. "1798.135" and "1798.135(c)(2)(A)".
+`CiteLinker` finds references with a pattern from law_info and links each to
+the longest of its cites that is indexed ("1798.135(c)(2)" if there is no
+"(A)" under it, and so on up to the section), leaving the rest as text.
+
+The pattern is law_info["cite_regex"], a regex ending in group 1, the section
+number (without a trailing period); by default, numbers with a dot in them
+("1798.100", "6254.5") or after "Section ". The chain of parenthesized
+subsection labels after it is matched automatically.
+
+A reference to a section that isn't on the page is looked up in the
+`CorpusIndex`, if one is given: the anchors of other documents, by the href of
+each document. It is linked there ("gov.html#6254(a)") only if exactly one
+document has it.
+
+    corpus = CorpusIndex()
+    corpus.add("gov_6250.html", AnchorIndex.from_indented(indented))
+    corpus.save("corpus.json")
+"""
+
+import functools
+import hashlib
+import json
+import re
+
+
+DEFAULT_CITE_REGEX = r"(?<![\w.])(\d+(?:\.\d+)+|(?<=ection )\d+)"
+
+SUBSECTIONS = r"(?P<subsections>(?:\([A-Za-z0-9]{1,5}\))*)"
+SUBSECTION = re.compile(r"\([A-Za-z0-9]{1,5}\)")
+
+# Styles of indent_statute() lines whose cite is an anchor on the page.
+ANCHORED_STYLES = ("TEXT", "LAW_HEADING", "BILL_HEADING")
+
+
+@functools.lru_cache(maxsize=32)
+def cite_pattern(cite_regex):
+    return re.compile(f"(?:{cite_regex}){SUBSECTIONS}")
+
+
+class AnchorIndex:
+    """The anchor ids of one rendered statute."""
+
+    def __init__(self, anchors=()):
+        self.anchors = set(anchors)
+
+    @classmethod
+    def from_indented(cls, indented):
+        return cls(
+            cite for (style, cite, _, _, _) in indented if style in ANCHORED_STYLES and cite
+        )
+
+    def __contains__(self, anchor):
+        return anchor in self.anchors
+
+    def __len__(self):
+        return len(self.anchors)
+
+    def update(self, other):
+        self.anchors |= other.anchors
+
+    def digest(self):
+        return hashlib.sha256("\n".join(sorted(self.anchors)).encode()).hexdigest()
+
+
+# A corpus entry for an anchor that more than one document has.
+AMBIGUOUS = object()
+
+
+class CorpusIndex:
+    """The anchors of several documents, for links between them."""
+
+    VERSION = 1
+
+    def __init__(self):
+        # document href -> AnchorIndex
+        self.documents = {}
+        # anchor -> document href, or AMBIGUOUS
+        self._owners = {}
+        self._digest = None
+
+    def add(self, href, anchors):
+        self.documents[href] = anchors
+        self._digest = None
+        for anchor in anchors.anchors:
+            owner = self._owners.get(anchor)
+            if owner is None:
+                self._owners[anchor] = href
+            elif owner != href:
+                self._owners[anchor] = AMBIGUOUS
+
+    def document(self, anchor):
+        """The href of the one document with `anchor`, or None."""
+        owner = self._owners.get(anchor)
+        return None if owner is AMBIGUOUS else owner
+
+    def digest(self):
+        if self._digest is None:
+            digest = hashlib.sha256()
+            for href in sorted(self.documents):
+                digest.update(f"{href}\n{self.documents[href].digest()}\n".encode())
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": self.VERSION,
+                    "documents": {
+                        href: sorted(anchors.anchors) for href, anchors in self.documents.items()
+                    },
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("version", 0) > cls.VERSION:
+            raise ValueError(f"corpus index version {stored['version']} is newer than {cls.VERSION}")
+        corpus = cls()
+        for href, anchors in stored["documents"].items():
+            corpus.add(href, AnchorIndex(anchors))
+        return corpus
+
+
+class CiteLinker:
+    def __init__(self, law_info, anchors, corpus=None):
+        self.pattern = cite_pattern(law_info.get("cite_regex", DEFAULT_CITE_REGEX))
+        self.anchors = anchors
+        self.corpus = corpus
+        # (section, subsections) -> (href, number of subsections linked), for
+        # every reference looked up; see IncrementalRenderer.
+        self.resolved = {}
+
+    def resolve(self, section, subsections):
+        """Returns (href, n): the href for the longest indexed cite of section
+        plus its first n `subsections`, or (None, 0)."""
+
+        for n in range(len(subsections), -1, -1):
+            anchor = section + "".join(subsections[:n])
+            if anchor in self.anchors:
+                return f"#{anchor}", n
+
+        if self.corpus is not None:
+            for n in range(len(subsections), -1, -1):
+                anchor = section + "".join(subsections[:n])
+                document = self.corpus.document(anchor)
+                if document is not None:
+                    return f"{document}#{anchor}", n
+
+        return None, 0
+
+    def link(self, text):
+        """Returns (text with its references linked, number of links)."""
+
+        links = 0
+
+        def replace(match):
+            nonlocal links
+
+            section = match.group(1)
+            subsections = SUBSECTION.findall(match.group("subsections"))
+
+            key = (section, tuple(subsections))
+            href, n = self.resolved[key] = self.resolve(section, subsections)
+            if href is None:
+                return match.group()
+
+            links += 1
+            cite_block = section + "".join(subsections[:n])
+            return (
+                text[match.start():match.start(1)]
+                + f"<a href = '{href}' class='heading'>{cite_block}</a>"
+                + "".join(subsections[n:])
+            )
+
+        return self.pattern.sub(replace, text), links
@@ -0,0 +1,198 @@
+"""HTML extraction backends for filter_html().
+
+A backend takes the html of a page and yields `(tag name, attributes, text)`
+for every h3, h4, h5, h6 and p element, in document order, where text is the
+stripped text of the element and everything inside it. filter_html() turns
+those into `filtered_statute` lines.
+
+    "soup"      Builds the full BeautifulSoup tree and searches it. This is
+                the original path, kept for output-equivalence checks.
+    "stream"    A `html.parser.HTMLParser` tokenizer that keeps only the text
+                of the relevant elements that are currently open. The default.
+
+The two give the same filter_html() output (tests/test_extract_html.py
+checks them on generated pages), except that character references are
+decoded by html.unescape() rather than BeautifulSoup's own tables, which
+differ on malformed ones such as `&bogus;` or a `&copy` with no semicolon.
+A SoupStrainer backend was dropped: without the enclosing elements it
+can't tell when closing one of them closes a heading, so the text after
+it ended up in the heading.
+
+Newlines are removed before parsing in every backend because they aren't
+relevant and they were causing errors in parsing some laws.
+"""
+
+from html.parser import HTMLParser
+
+
+RELEVANT_TAGS = ["h3", "h4", "h5", "h6", "p"]
+
+# Elements that never contain anything, so never stay open.
+VOID_TAGS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed",
+    "frame", "hr", "image", "img", "input", "isindex", "keygen", "link",
+    "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+}
+
+# get_text() leaves out the contents of these.
+NON_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+
+# Whitespace in these is kept as it is.
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+def soup_elements(html_content):
+    # bs4 is slow to import and only this backend needs it.
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content.replace("\n", ""), "html.parser")
+    for line in soup.find_all(RELEVANT_TAGS):
+        yield line.name, line.attrs, line.get_text().strip()
+
+
+class ElementStream(HTMLParser):
+    """Collects the relevant elements as the html is fed in.
+
+    Tags and strings are treated as in BeautifulSoup's html.parser tree
+    builder: closing a tag closes everything opened inside it, and closing a
+    tag that isn't open does nothing. The text between two tags (or
+    comments, CDATA sections, ...) is one string, and a string of nothing
+    but whitespace counts as a single space, outside <pre> and <textarea>.
+    Elements are released in the order they were opened, once closed.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # open tag names, innermost last
+        self.open_tags = []
+        # [name, attrs, text pieces, closed] for each relevant element, in
+        # document order, until it has been released.
+        self.pending = []
+        # the entries of `pending` that are still open
+        self.collecting = []
+        self.non_text_depth = 0
+        self.preserve_depth = 0
+        # the pieces of the string being read
+        self.data = []
+        # void tags opened without "/>", whose next end tag is ignored
+        self.closed_void_tags = []
+
+    def end_data(self, cdata=False):
+        """Adds the string read since the last tag to the open elements."""
+        if not self.data:
+            return
+        text = "".join(self.data)
+        self.data = []
+        if not self.preserve_depth and not text.strip(ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        # A CDATA section is text even in a <template>.
+        if self.non_text_depth and not cdata:
+            return
+        for element in self.collecting:
+            element[2].append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self.end_data()
+        if tag in VOID_TAGS:
+            self.closed_void_tags.append(tag)
+            return
+        self.open_tag(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.end_data()
+        if tag not in VOID_TAGS:
+            self.open_tag(tag, attrs)
+        self.close_tag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_void_tags:
+            self.closed_void_tags.remove(tag)
+            return
+        self.end_data()
+        self.close_tag(tag)
+
+    def open_tag(self, tag, attrs):
+        self.open_tags.append(tag)
+        if tag in NON_TEXT_TAGS:
+            self.non_text_depth += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+        if tag in RELEVANT_TAGS:
+            attributes = {name: "" if value is None else value for name, value in attrs}
+            element = [tag, attributes, [], False]
+            self.pending.append(element)
+            self.collecting.append(element)
+
+    def close_tag(self, tag):
+        if tag not in self.open_tags:
+            return
+        while True:
+            name = self.open_tags.pop()
+            if name in NON_TEXT_TAGS:
+                self.non_text_depth -= 1
+            if name in PRESERVE_WHITESPACE_TAGS:
+                self.preserve_depth -= 1
+            if name in RELEVANT_TAGS:
+                self.collecting.pop()[3] = True
+            if name == tag:
+                break
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def unknown_decl(self, data):
+        # CDATA sections are text; other declarations aren't.
+        self.end_data()
+        if data.upper().startswith("CDATA["):
+            self.data.append(data[len("CDATA["):])
+            self.end_data(cdata=True)
+
+    def handle_comment(self, data):
+        self.end_data()
+
+    def handle_decl(self, decl):
+        self.end_data()
+
+    def handle_pi(self, data):
+        self.end_data()
+
+    def close(self):
+        super().close()
+        self.end_data()
+        for element in self.collecting:
+            element[3] = True
+        self.collecting = []
+        self.open_tags = []
+
+    def released(self):
+        """Yields the finished elements at the front of the queue."""
+        index = 0
+        while index < len(self.pending) and self.pending[index][3]:
+            name, attributes, text, _ = self.pending[index]
+            yield name, attributes, "".join(text).strip()
+            index += 1
+        del self.pending[:index]
+
+
+def stream_elements(html_content, chunk_size=1 << 16):
+    """`html_content` is a string or an iterable of string chunks."""
+    if isinstance(html_content, str):
+        text = html_content
+        chunks = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+    else:
+        chunks = html_content
+
+    parser = ElementStream()
+    for chunk in chunks:
+        parser.feed(chunk.replace("\n", ""))
+        yield from parser.released()
+    parser.close()
+    yield from parser.released()
+
+
+HTML_BACKENDS = {
+    "soup": soup_elements,
+    "stream": stream_elements,
+}
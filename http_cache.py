@@ -0,0 +1,157 @@
+"""On-disk HTTP cache for fetching leginfo pages.
+
+Each cached URL is two files named after the hash of the URL: the body, and
+a small json file with its ETag, Last-Modified, encoding and fetch time.
+
+    cache = HTTPCache(ttl=3600, max_bytes=256 * 2**20)
+    html = cache.get(url)
+
+A response younger than `ttl` seconds is served without touching the
+network. An older one is revalidated with a conditional GET (If-None-Match /
+If-Modified-Since), so an unchanged page costs a 304 instead of the whole
+body. When the bodies add up to more than `max_bytes`, the least recently
+used ones are evicted. With `offline=True` only the cache is used.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from atomic import write_atomic
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "statute_parse", "http")
+
+
+class OfflineCacheMiss(Exception):
+    """The cache is offline and doesn't have the URL."""
+
+
+class HTTPCache:
+    def __init__(
+        self,
+        directory=DEFAULT_CACHE_DIR,
+        ttl=3600,
+        max_bytes=256 * 2**20,
+        offline=False,
+        session=None,
+        timeout=(10, 60),
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.timeout = timeout
+        self._session = session
+
+    @property
+    def session(self):
+        # One pooled session for every fetch through this cache.
+        if self._session is None:
+            # Imported on first fetch, so startup without one is faster.
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def get(self, url):
+        """Returns the text of the page at `url`."""
+
+        body_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+        if meta is not None and not os.path.exists(body_path):
+            meta = None
+
+        if meta is not None and (
+            self.offline or time.time() - meta["fetched"] < self.ttl
+        ):
+            return self._read_body(body_path, meta)
+
+        if self.offline:
+            raise OfflineCacheMiss(url)
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and meta is not None:
+            meta["fetched"] = time.time()
+            write_atomic(meta_path, json.dumps(meta).encode())
+            return self._read_body(body_path, meta)
+
+        response.raise_for_status()
+
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding or response.apparent_encoding,
+            "fetched": time.time(),
+        }
+        write_atomic(body_path, response.content)
+        write_atomic(meta_path, json.dumps(meta).encode())
+        self.evict()
+
+        return response.content.decode(meta["encoding"] or "utf-8", errors="replace")
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits in
+        `max_bytes`."""
+
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".body"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            for stale in (path, path[: -len(".body")] + ".json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith((".body", ".json")):
+                os.remove(os.path.join(self.directory, name))
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return (
+            os.path.join(self.directory, key + ".body"),
+            os.path.join(self.directory, key + ".json"),
+        )
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _read_body(self, body_path, meta):
+        with open(body_path, "rb") as f:
+            body = f.read()
+        # The body's mtime is its last use, for LRU eviction.
+        os.utime(body_path)
+        return body.decode(meta["encoding"] or "utf-8", errors="replace")
@@ -0,0 +1,144 @@
+"""Incremental re-rendering of a statute, one section at a time.
+
+The outline is reset at every law_heading and bill_heading, and collision
+lookahead stops at the next heading, so each section indents and links
+independently of the others. `IncrementalRenderer` fingerprints the
+filtered lines of every section and only runs indent_statute() and
+hyperlink() on sections whose fingerprint it hasn't seen in the previous
+render; the rest reuse their earlier output. Cites are only linked to
+sections that exist, so an unchanged section is linked again too if one of
+the sections it cites has appeared or gone.
+
+    renderer = IncrementalRenderer(law_info)
+    html, report = renderer.render(filtered_statute)
+    # ... the statute is amended ...
+    html, report = renderer.render(new_filtered_statute)
+    report["changed"]  # e.g. ["1798.140"]
+"""
+
+import hashlib
+
+import server
+from crossref import AnchorIndex, CiteLinker
+from render_cache import law_info_digest
+
+
+HEADINGS = ("law_heading", "bill_heading")
+
+
+def split_sections(filtered_statute):
+    """Splits the lines at each heading. Yields (section id, lines); the id
+    is the heading's section number ("" for lines before the first one), with
+    "#2", "#3"... added when a number repeats."""
+
+    seen = {}
+
+    def section_id(section):
+        seen[section] = seen.get(section, 0) + 1
+        if seen[section] == 1:
+            return section
+        return f"{section}#{seen[section]}"
+
+    lines = []
+    current = ""
+    for line in filtered_statute:
+        if line[0] in HEADINGS:
+            if lines:
+                yield section_id(current), lines
+            lines = []
+            current = line[1]
+        lines.append(line)
+    if lines:
+        yield section_id(current), lines
+
+
+class IncrementalRenderer:
+    def __init__(self, law_info, corpus=None):
+        self.law_info = law_info
+        self.corpus = corpus
+        self._law_info_digest = law_info_digest(law_info)
+        # section id -> fingerprint, for the previous render
+        self._previous = {}
+        # fingerprint -> indented lines, for the sections of the previous
+        # render
+        self._indented = {}
+        # fingerprint -> (html lines, the cites they link and where to), for
+        # the sections of the previous render
+        self._rendered = {}
+
+    def fingerprint(self, lines):
+        digest = hashlib.sha256(self._law_info_digest.encode())
+        for line in lines:
+            digest.update(repr(line).encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def render(self, filtered_statute):
+        """Returns the html lines for `filtered_statute` and a report dict
+        with the ids of the "changed", "added" and "removed" sections, the ids
+        of the "relinked" ones (unchanged, but with cites that now link
+        elsewhere, since a section they cite was added or removed) and the
+        number "reused" from the previous render."""
+
+        current = {}
+        indented_sections = {}
+        sections = []
+        report = {"changed": [], "added": [], "removed": [], "relinked": [], "reused": 0}
+
+        for section, lines in split_sections(filtered_statute):
+            fingerprint = self.fingerprint(lines)
+            current[section] = fingerprint
+
+            indented = self._indented.get(fingerprint) or indented_sections.get(fingerprint)
+            if indented is None:
+                indented = server.indent_statute(lines, self.law_info)
+            indented_sections[fingerprint] = indented
+            sections.append((section, fingerprint, indented))
+
+            if section not in self._previous:
+                report["added"].append(section)
+            elif self._previous[section] != fingerprint:
+                report["changed"].append(section)
+
+        report["removed"] = [section for section in self._previous if section not in current]
+
+        # Cites link only to sections that exist, so every section's links
+        # depend on the whole statute.
+        anchors = AnchorIndex()
+        for _, _, indented in sections:
+            anchors.update(AnchorIndex.from_indented(indented))
+        checker = CiteLinker(self.law_info, anchors, self.corpus)
+
+        new_html = []
+        rendered = {}
+        for section, fingerprint, indented in sections:
+            cached = self._rendered.get(fingerprint) or rendered.get(fingerprint)
+            if cached is not None and all(
+                checker.resolve(*reference) == target for reference, target in cached[1].items()
+            ):
+                report["reused"] += 1
+            else:
+                if cached is not None:
+                    report["relinked"].append(section)
+                linker = CiteLinker(self.law_info, anchors, self.corpus)
+                html = server.hyperlink(indented, self.law_info, cite_linker=linker)
+                cached = (html, linker.resolved)
+
+            rendered[fingerprint] = cached
+            new_html.extend(cached[0])
+
+        # Only the sections of this render are kept for the next one.
+        self._previous = current
+        self._indented = indented_sections
+        self._rendered = rendered
+
+        return new_html, report
+
+    def format_statute(self, law_text, template, http_cache=None):
+        """Like server.format_statute(), but re-renders only the sections
+        that changed since the last call. Returns (html, report)."""
+
+        source_text = server.read_source(law_text, http_cache)
+        filtered_statute = list(server.filter_source(law_text, source_text, self.law_info))
+        title = server.statute_title(filtered_statute, self.law_info)
+        new_html, report = self.render(filtered_statute)
+        return server.fill_template(template, title, new_html), report
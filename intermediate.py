@@ -0,0 +1,256 @@
+"""Stored indent_statute() output, so a statute is parsed once and rendered
+any number of times.
+
+The intermediate is the list of (style, cite, depth, label, text) tuples
+from indent_statute(), plus a header with the title and law_info needed to
+render it. There are two formats, chosen by file extension:
+
+JSON Lines (.jsonl), version 1: the first line is the header,
+
+    {"format": "statute-indented", "version": 1, "title": "...", "law_info": {...}}
+
+and every other line is one tuple as a json array,
+
+    ["TEXT", "1798.100(a)", 2, "a", "A consumer shall have ..."]
+
+Binary (.stix), version 1: the same header and tuples, smaller and faster
+to read. Integers are unsigned LEB128 varints and strings are a varint
+length followed by that many bytes of utf-8.
+
+    b"STIX", version (1 byte), header (string, json)
+    then per tuple:
+        style (1 byte, the index in STYLES)
+        depth (varint)
+        cite (varint: length of the prefix shared with the previous cite,
+              then the rest as a string)
+        label (string)
+        text (string)
+    then b"\\xff"
+
+    write_indented("ccpa.stix", indented, title, law_info)
+    stored = read_indented("ccpa.stix")
+    html = render_stored("ccpa.stix", "index_template_general.html")
+"""
+
+import json
+import os
+
+import server
+from crossref import AnchorIndex
+from template import load_template
+
+
+FORMAT = "statute-indented"
+VERSION = 1
+
+MAGIC = b"STIX"
+END = 0xFF
+
+STYLES = ("TEXT", "NONE", "INDENTERROR", "LAW_HEADING", "BILL_HEADING")
+STYLE_CODES = {style: code for code, style in enumerate(STYLES)}
+
+
+class FormatError(ValueError):
+    """The file isn't a stored statute this version can read."""
+
+
+def is_binary(path):
+    return os.path.splitext(path)[1] == ".stix"
+
+
+def make_header(title, law_info):
+    return {"format": FORMAT, "version": VERSION, "title": title, "law_info": law_info}
+
+
+def dump_header(title, law_info):
+    return json.dumps(make_header(title, law_info), ensure_ascii=False, default=str)
+
+
+def check_header(header):
+    """Returns the header, with the label_hierarchy keys back to the integer
+    depths that json turned into strings."""
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise FormatError("not a stored statute")
+    if header.get("version", 0) > VERSION:
+        raise FormatError(f"stored statute version {header['version']} is newer than {VERSION}")
+    header["law_info"] = server.load_law_info(header["law_info"])
+    return header
+
+
+# JSON Lines
+
+def write_jsonl(f, indented, title, law_info):
+    """Writes to the text file `f`."""
+    f.write(dump_header(title, law_info) + "\n")
+    for line in indented:
+        f.write(json.dumps(list(line), ensure_ascii=False) + "\n")
+
+
+def read_jsonl(f):
+    """Returns (header, iterator of tuples) for the text file `f`."""
+    header = check_header(json.loads(f.readline() or "null"))
+    return header, (tuple(json.loads(line)) for line in f if line.strip())
+
+
+# Binary
+
+def write_varint(f, n):
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    f.write(out)
+
+
+def read_varint(f):
+    n = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise FormatError("truncated stored statute")
+        n |= (byte[0] & 0x7F) << shift
+        if byte[0] < 0x80:
+            return n
+        shift += 7
+
+
+def write_string(f, text):
+    data = text.encode("utf-8", "surrogatepass")
+    write_varint(f, len(data))
+    f.write(data)
+
+
+def read_string(f):
+    length = read_varint(f)
+    data = f.read(length)
+    if len(data) != length:
+        raise FormatError("truncated stored statute")
+    return data.decode("utf-8", "surrogatepass")
+
+
+def write_binary(f, indented, title, law_info):
+    """Writes to the binary file `f`."""
+    f.write(MAGIC)
+    f.write(bytes([VERSION]))
+    write_string(f, dump_header(title, law_info))
+
+    previous_cite = ""
+    for (style, cite, depth, label, text) in indented:
+        f.write(bytes([STYLE_CODES[style]]))
+        write_varint(f, depth)
+        shared = len(os.path.commonprefix((previous_cite, cite)))
+        write_varint(f, shared)
+        write_string(f, cite[shared:])
+        write_string(f, label)
+        write_string(f, text)
+        previous_cite = cite
+    f.write(bytes([END]))
+
+
+def read_binary(f):
+    """Returns (header, iterator of tuples) for the binary file `f`."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise FormatError("not a stored statute")
+    version = f.read(1)
+    if not version or version[0] > VERSION:
+        raise FormatError("stored statute version is newer than this one")
+    header = check_header(json.loads(read_string(f)))
+    return header, iter_binary(f)
+
+
+def iter_binary(f):
+    previous_cite = ""
+    while True:
+        code = f.read(1)
+        if not code:
+            raise FormatError("truncated stored statute")
+        if code[0] == END:
+            return
+        depth = read_varint(f)
+        shared = read_varint(f)
+        cite = previous_cite[:shared] + read_string(f)
+        label = read_string(f)
+        text = read_string(f)
+        yield (STYLES[code[0]], cite, depth, label, text)
+        previous_cite = cite
+
+
+# Files
+
+def write_indented(path, indented, title, law_info):
+    """Stores `indented` at `path`, in the format its extension names."""
+    if is_binary(path):
+        with open(path, "wb") as f:
+            write_binary(f, indented, title, law_info)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            write_jsonl(f, indented, title, law_info)
+
+
+class StoredStatute:
+    """A stored statute. The header is read right away; the tuples are read
+    lazily, from the start, each time the object is iterated."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._open() as f:
+            self.header = self._read(f)[0]
+
+    @property
+    def title(self):
+        return self.header["title"]
+
+    @property
+    def law_info(self):
+        return self.header["law_info"]
+
+    def __iter__(self):
+        with self._open() as f:
+            yield from self._read(f)[1]
+
+    def _open(self):
+        if is_binary(self.path):
+            return open(self.path, "rb")
+        return open(self.path, encoding="utf-8")
+
+    def _read(self, f):
+        return read_binary(f) if is_binary(self.path) else read_jsonl(f)
+
+
+def read_indented(path):
+    return StoredStatute(path)
+
+
+def stored_anchors(path):
+    """The crossref.AnchorIndex of a stored statute, e.g. for a corpus."""
+    return AnchorIndex.from_indented(read_indented(path))
+
+
+def parse_to_file(law_text, law_info, path, http_cache=None):
+    """Parses `law_text` as far as indent_statute() and stores the result."""
+    filtered_statute = list(server.iter_source(law_text, law_info, http_cache))
+    title = server.statute_title(filtered_statute, law_info)
+    write_indented(path, server.iter_indent_statute(filtered_statute, law_info), title, law_info)
+
+
+def render_stored(path, template, law_info=None, corpus=None):
+    """The formatted statute from a stored one, without parsing again.
+    `law_info` (for the defined terms) defaults to the stored one."""
+    stored = read_indented(path)
+    law_info = law_info if law_info is not None else stored.law_info
+    new_html = server.hyperlink(stored, law_info, corpus=corpus)
+    return server.fill_template(template, stored.title, new_html)
+
+
+def stream_stored(path, template, sink, law_info=None, corpus=None):
+    """render_stored(), writing to `sink` one line at a time. The file is
+    read twice: once for its anchors, then to render it."""
+    stored = read_indented(path)
+    law_info = law_info if law_info is not None else stored.law_info
+    compiled = load_template(template)
+    compiled.write_head(sink, stored.title)
+    for line in server.iter_hyperlink(stored, law_info, corpus=corpus):
+        sink.write(line)
+    compiled.write_tail(sink, stored.title)
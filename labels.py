@@ -0,0 +1,172 @@
+"""Outline labels.
+
+`LABELS` maps between the ordinal of an outline entry and its label for every
+label type ("lower", "arabic", "capital", "romanette", "roman"), e.g.
+`LABELS.label("lower", 3)` is "c" and `LABELS.ordinal("roman", "IV")` is 4.
+
+Ordinal 0 is the label "0" for every type; it stands for "no entry yet at this
+level" in the outline status.
+
+Labels up to the old hard-coded limits (az, ZZ, 500, D) are tabled, each
+type's table the first time the type is used. Anything past that is generated
+arithmetically, so "ba", "AAA" and "DI" work too. Repeated types such as `lower2` share the table of their base
+type.
+"""
+
+import re
+
+
+ROMAN_NUMERALS = [
+    (1000, "M"),
+    (900, "CM"),
+    (500, "D"),
+    (400, "CD"),
+    (100, "C"),
+    (90, "XC"),
+    (50, "L"),
+    (40, "XL"),
+    (10, "X"),
+    (9, "IX"),
+    (5, "V"),
+    (4, "IV"),
+    (1, "I"),
+]
+
+ROMAN_VALUES = {"I": 1, "V": 5, "X": 10, "L": 50, "C": 100, "D": 500, "M": 1000}
+
+
+def lower_label(ordinal):
+    """a, b, ... z, aa, ab, ... az, ba, ..."""
+    label = ""
+    while ordinal > 0:
+        ordinal, remainder = divmod(ordinal - 1, 26)
+        label = chr(ord("a") + remainder) + label
+    return label
+
+
+def lower_ordinal(label):
+    if not re.fullmatch("[a-z]+", label):
+        raise KeyError(label)
+    ordinal = 0
+    for char in label:
+        ordinal = ordinal * 26 + ord(char) - ord("a") + 1
+    return ordinal
+
+
+def capital_label(ordinal):
+    """A, B, ... Z, AA, BB, ... ZZ, AAA, ..."""
+    repeat, remainder = divmod(ordinal - 1, 26)
+    return chr(ord("A") + remainder) * (repeat + 1)
+
+
+def capital_ordinal(label):
+    if not re.fullmatch("([A-Z])\\1*", label):
+        raise KeyError(label)
+    return (len(label) - 1) * 26 + ord(label[0]) - ord("A") + 1
+
+
+def arabic_label(ordinal):
+    return str(ordinal)
+
+
+def arabic_ordinal(label):
+    if not label.isdigit() or str(int(label)) != label:
+        raise KeyError(label)
+    return int(label)
+
+
+def roman_label(ordinal):
+    label = ""
+    for value, numeral in ROMAN_NUMERALS:
+        count, ordinal = divmod(ordinal, value)
+        label += numeral * count
+    return label
+
+
+def roman_ordinal(label):
+    total = 0
+    previous = 0
+    for char in reversed(label):
+        try:
+            value = ROMAN_VALUES[char]
+        except KeyError:
+            raise KeyError(label) from None
+        if value < previous:
+            total -= value
+        else:
+            total += value
+            previous = value
+    # Only accept the canonical spelling ("IV", not "IIII").
+    if total == 0 or roman_label(total) != label:
+        raise KeyError(label)
+    return total
+
+
+def romanette_label(ordinal):
+    return roman_label(ordinal).lower()
+
+
+def romanette_ordinal(label):
+    if not label.islower():
+        raise KeyError(label)
+    return roman_ordinal(label.upper())
+
+
+# label type: (ordinal -> label, label -> ordinal, size of the prebuilt table)
+LABEL_TYPES = {
+    "lower": (lower_label, lower_ordinal, 52),
+    "arabic": (arabic_label, arabic_ordinal, 500),
+    "capital": (capital_label, capital_ordinal, 52),
+    "romanette": (romanette_label, romanette_ordinal, 500),
+    "roman": (roman_label, roman_ordinal, 500),
+}
+
+
+def base_type(label_type):
+    """`lower2` (a second lower-case level in one hierarchy) labels like `lower`."""
+    base = label_type.rstrip("0123456789")
+    if base not in LABEL_TYPES:
+        raise KeyError(label_type)
+    return base
+
+
+class LabelCodec:
+    """Two-way ordinal <-> label lookup for every label type. Each type's
+    tables are built the first time it is used, not at import."""
+
+    def __init__(self):
+        self._labels = {}
+        self._ordinals = {}
+
+    def _build(self, label_type):
+        to_label, _, size = LABEL_TYPES[label_type]
+        table = ["0"] + [to_label(i) for i in range(1, size + 1)]
+        self._ordinals[label_type] = {label: i for i, label in enumerate(table)}
+        self._labels[label_type] = table
+        return table
+
+    def label(self, label_type, ordinal):
+        """The label at position `ordinal` (0 is "0")."""
+        label_type = base_type(label_type)
+        table = self._labels.get(label_type) or self._build(label_type)
+        if ordinal < len(table):
+            return table[ordinal]
+        return LABEL_TYPES[label_type][0](ordinal)
+
+    def ordinal(self, label_type, label):
+        """The position of `label`; raises KeyError if it isn't a label of this type."""
+        label_type = base_type(label_type)
+        if label_type not in self._ordinals:
+            self._build(label_type)
+        try:
+            return self._ordinals[label_type][label]
+        except KeyError:
+            return LABEL_TYPES[label_type][1](label)
+
+    def table(self, label_type):
+        """The list of tabled labels, indexed by ordinal."""
+        label_type = base_type(label_type)
+        return self._labels.get(label_type) or self._build(label_type)
+
+
+LABELS = LabelCodec()
@@ -1,6 +1,288 @@
-def main():
-    print("Hello from statute-parse!")
+"""Command line entry point.
+
+    python main.py batch manifest.jsonl [--out-dir out] [--workers N] [--fetchers N] [--store S]
+    python main.py convert source output.html [--template T] [--shard-size N] [--workers N]
+    python main.py convert source output.html --store stages.sqlite [--store-max-age SECS]
+        (resumes stored pages and stages)
+    python main.py convert statute.txt output.html --stream [--mmap]    (or - for stdin)
+    python main.py parse source statute.stix|statute.jsonl [--law-info F]
+    python main.py render statute.stix output.html [--template T]
+    python main.py corpus corpus.json statute.stix... (then --corpus corpus.json to convert/render)
+    python main.py index search_index statute.stix...
+    python main.py search search_index '"personal information" sell*' [--limit N]
+    python main.py crawl https://leginfo.legislature.ca.gov/faces/codesTOCSelected.xhtml?tocCode=GOV
+        [--state crawl.json] [--out-dir out] [--concurrency N] [--delay SECS] [--record DIR]
+    python main.py serve [--port N] [--workers N] [--queue-size N] [--timeout SECS] [--store S]
+    python main.py gc stages.sqlite [--max-age DAYS] [--vacuum]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import batch
+import crossref
+import intermediate
+import search
+import server
+import shard
+import store
+from http_cache import HTTPCache
+
+
+def load_corpus(path):
+    if path is None:
+        return None
+    return crossref.CorpusIndex.load(path)
+
+
+def read_law_info(path):
+    """law_info from a JSON file, or server.default_law_info."""
+    law_info = None
+    if path:
+        with open(path) as f:
+            law_info = json.load(f)
+    return server.load_law_info(law_info)
+
+
+def stored_name(path):
+    """The document name of a stored statute: NAME for NAME.stix."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def run_batch(args):
+    items = batch.read_manifest(args.manifest)
+    results = batch.run_batch(
+        items,
+        out_dir=args.out_dir,
+        workers=args.workers,
+        fetchers=args.fetchers,
+        store=args.store,
+        store_max_age=args.store_max_age,
+        http_cache=HTTPCache(),
+    )
+    failed = sum(1 for result in results if result["error"])
+    total_bytes = sum(result["bytes"] for result in results)
+    print(f"{len(results) - failed} converted, {failed} failed, {total_bytes:,} bytes")
+    return 1 if failed else 0
+
+
+def run_convert(args):
+    law_info = read_law_info(args.law_info)
+    corpus = load_corpus(args.corpus)
+    http_cache = HTTPCache()
+    if args.store:
+        html = store.format_statute(
+            args.source,
+            law_info,
+            args.template,
+            store.StageStore(args.store),
+            http_cache=http_cache,
+            corpus=corpus,
+            max_age=args.store_max_age,
+        )
+        batch.write_atomic(args.output, html)
+        return 0
+    if args.stream:
+        with open(args.output, "w", encoding="utf-8") as f:
+            server.stream_statute(
+                args.source,
+                law_info,
+                args.template,
+                f,
+                http_cache=http_cache,
+                use_mmap=args.mmap,
+                corpus=corpus,
+            )
+        return 0
+
+    html = shard.format_statute(
+        args.source,
+        law_info,
+        args.template,
+        shard_size=args.shard_size,
+        workers=args.workers,
+        http_cache=http_cache,
+        corpus=corpus,
+    )
+    batch.write_atomic(args.output, html)
+    return 0
+
+
+def run_parse(args):
+    intermediate.parse_to_file(
+        args.source, read_law_info(args.law_info), args.stored, http_cache=HTTPCache()
+    )
+    return 0
+
+
+def run_render(args):
+    with open(args.output, "w", encoding="utf-8") as f:
+        intermediate.stream_stored(args.stored, args.template, f, corpus=load_corpus(args.corpus))
+    return 0
+
+
+def run_corpus(args):
+    corpus = crossref.CorpusIndex()
+    for path in args.stored:
+        corpus.add(stored_name(path) + ".html", intermediate.stored_anchors(path))
+    corpus.save(args.index)
+    return 0
+
+
+def run_index(args):
+    search_index = search.SearchIndex(args.directory)
+    for path in args.stored:
+        name = stored_name(path)
+        added = search_index.add_document(name, intermediate.read_indented(path), f"{name}.html")
+        print(f"{'indexed' if added else 'unchanged'} {name}")
+    return 0
+
+
+def run_search(args):
+    for hit in search.SearchIndex(args.directory).search(args.query, args.limit):
+        print(f"{hit.score:6.2f}  {hit.link}  {hit.text[:80]}")
+    return 0
+
+
+def run_crawl(args):
+    # crawl and web pull in http.server and asyncio, which would add about
+    # 100ms to every other command's start (see benchmarks/startup.py).
+    import crawl
+
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    os.makedirs(args.out_dir, exist_ok=True)
+    state = crawl.Crawler(
+        args.start_url,
+        args.state,
+        args.out_dir,
+        concurrency=args.concurrency,
+        delay=args.delay,
+        workers=args.workers,
+        record_dir=args.record,
+    ).run()
+    print(f"{len(state.done)} of {len(state.discovered)} pages done, {len(state.failed)} failed")
+    return 1 if state.failed else 0
+
+
+def run_serve(args):
+    import web
+
+    web.main(
+        port=args.port,
+        workers=args.workers,
+        fetchers=args.fetchers,
+        queue_size=args.queue_size,
+        request_timeout=args.timeout,
+        store=args.store,
+        store_max_age=args.store_max_age,
+    )
+    return 0
+
+
+def run_gc(args):
+    stages = store.StageStore(args.store)
+    max_age = args.max_age * 86400 if args.max_age is not None else None
+    deleted = stages.gc(max_age=max_age, vacuum=args.vacuum)
+    print(
+        f"deleted {deleted['sources']} sources, {deleted['pages']} pages,"
+        f" {deleted['stages']} stages; {stages.stats()['bytes']:,} bytes left"
+    )
+    return 0
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="statute-parse")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    command = commands.add_parser("batch", help="convert every statute in a manifest")
+    command.add_argument("manifest", help="JSON Lines file with one item per statute")
+    command.add_argument("--out-dir", default=".", help="where outputs without an explicit path go")
+    command.add_argument("--workers", type=int, default=None, help="parsing processes (default: one per core)")
+    command.add_argument("--fetchers", type=int, default=8, help="concurrent downloads")
+    command.add_argument("--store", default=None, help="SQLite stage store, kept between runs")
+    command.add_argument("--store-max-age", type=float, default=None, help="seconds before a stored page is fetched again (default: never)")
+    command.set_defaults(run=run_batch)
+
+    command = commands.add_parser("convert", help="convert one statute, in parallel shards")
+    command.add_argument("source", help="leginfo URL, .txt/.html file or - for text on stdin")
+    command.add_argument("output", help="where to write the html")
+    command.add_argument("--template", default="index_template_general.html")
+    command.add_argument("--law-info", default=None, help="JSON file with law_info (default: server.default_law_info)")
+    command.add_argument("--shard-size", type=int, default=2000, help="lines per shard (whole sections)")
+    command.add_argument("--workers", type=int, default=None, help="parsing processes (default: one per core)")
+    command.add_argument("--corpus", default=None, help="corpus index, for links to other documents")
+    command.add_argument("--stream", action="store_true", help="one line at a time, in constant memory")
+    command.add_argument("--mmap", action="store_true", help="with --stream, memory-map text files")
+    command.add_argument("--store", default=None, help="SQLite stage store; resumes from the deepest stored stage")
+    command.add_argument("--store-max-age", type=float, default=None, help="seconds before a stored page is fetched again (default: never)")
+    command.set_defaults(run=run_convert)
+
+    command = commands.add_parser("parse", help="parse a statute once into a stored intermediate")
+    command.add_argument("source", help="leginfo URL, .txt/.html file or - for text on stdin")
+    command.add_argument("stored", help=".stix (binary) or .jsonl file to write")
+    command.add_argument("--law-info", default=None, help="JSON file with law_info (default: server.default_law_info)")
+    command.set_defaults(run=run_parse)
+
+    command = commands.add_parser("render", help="render a stored intermediate without parsing again")
+    command.add_argument("stored", help=".stix or .jsonl file written by parse")
+    command.add_argument("output", help="where to write the html")
+    command.add_argument("--template", default="index_template_general.html")
+    command.add_argument("--corpus", default=None, help="corpus index, for links to other documents")
+    command.set_defaults(run=run_render)
+
+    command = commands.add_parser("corpus", help="index the anchors of stored statutes, for links between them")
+    command.add_argument("index", help="the corpus index (json) to write")
+    command.add_argument("stored", nargs="+", help=".stix or .jsonl files; NAME.stix is linked as NAME.html")
+    command.set_defaults(run=run_corpus)
+
+    command = commands.add_parser("index", help="add stored statutes to a full-text search index")
+    command.add_argument("directory", help="the search index")
+    command.add_argument("stored", nargs="+", help=".stix or .jsonl files; NAME.stix is linked as NAME.html")
+    command.set_defaults(run=run_index)
+
+    command = commands.add_parser("search", help="search a full-text search index")
+    command.add_argument("directory", help="the search index")
+    command.add_argument("query", help='words, "quoted phrases" and prefix* terms')
+    command.add_argument("--limit", type=int, default=10)
+    command.set_defaults(run=run_search)
+
+    command = commands.add_parser("crawl", help="convert every article of a code, from its table of contents")
+    command.add_argument("start_url", help="the code's table of contents on leginfo")
+    command.add_argument("--state", default="crawl.json", help="progress file; rerun with it to resume")
+    command.add_argument("--out-dir", default=".", help="where the converted articles go")
+    command.add_argument("--concurrency", type=int, default=4, help="concurrent downloads")
+    command.add_argument("--delay", type=float, default=1.0, help="seconds between requests to the site")
+    command.add_argument("--workers", type=int, default=None, help="parsing processes (default: one per core)")
+    command.add_argument("--record", default=None, help="also save every page fetched to this directory")
+    command.set_defaults(run=run_crawl)
+
+    command = commands.add_parser("serve", help="run the Indent California web service")
+    command.add_argument("--port", type=int, default=None, help="default: $PORT, or 3000")
+    command.add_argument("--workers", type=int, default=None, help="parsing processes (default: one per core)")
+    command.add_argument("--fetchers", type=int, default=8, help="concurrent downloads")
+    command.add_argument("--queue-size", type=int, default=16, help="requests that may wait for a worker")
+    command.add_argument("--timeout", type=float, default=60, help="seconds allowed per statute")
+    command.add_argument("--store", default=None, help="SQLite stage store, kept across restarts (statutes are then sent whole, not streamed)")
+    command.add_argument("--store-max-age", type=float, default=3600, help="seconds before a stored page is fetched again")
+    command.set_defaults(run=run_serve)
+
+    command = commands.add_parser("gc", help="delete what a stage store no longer needs")
+    command.add_argument("store", help="the SQLite stage store")
+    command.add_argument("--max-age", type=float, default=None, help="also forget sources unused for this many days")
+    command.add_argument("--vacuum", action="store_true", help="give the freed space back to the file system")
+    command.set_defaults(run=run_gc)
+
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    return args.run(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
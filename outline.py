@@ -0,0 +1,143 @@
+"""Outline state for indent_statute().
+
+`OutlineState` tracks where we are in the outline: the current count at
+each level of the label hierarchy and the current depth. It keeps the labels
+that are allowed next (`permissible`) and the cite of the current position
+up to date as it changes, so each line costs in proportion to how far the
+depth moves rather than to the size of the hierarchy.
+
+Depths are outline depths: 0 for headings, 1 for text without a label, and
+level + 2 for a label at `level` of the hierarchy.
+"""
+
+from array import array
+
+from labels import LABELS
+
+
+class OutlineState:
+    __slots__ = (
+        "label_types",
+        "counts",
+        "depth",
+        "permissible",
+        "_levels_by_label",
+        "_cites",
+        "_cites_valid",
+    )
+
+    def __init__(self, label_hierarchy):
+        self.label_types = [label_hierarchy[i] for i in range(len(label_hierarchy))]
+        # counts[level] is the ordinal of the current label at that level;
+        # levels deeper than the current one are always 0.
+        self.counts = array("l", [0] * len(self.label_types))
+        self.depth = 0
+        # permissible[level] is the label that may come next at that level.
+        self.permissible = [None] * len(self.label_types)
+        # label -> bitmask of the levels at which it is permissible.
+        self._levels_by_label = {}
+        # _cites[level] is the parenthetical cite through that level, e.g.
+        # "(c)(2)(A)" for level 2; only entries below _cites_valid are current.
+        self._cites = [""] * len(self.label_types)
+        self._cites_valid = 0
+
+        for level in range(len(self.label_types)):
+            self._update_permissible(level)
+
+    def open_levels(self, depth):
+        """The number of levels (counting from the top) at which the next
+        label may be taken: down to one level below the current one."""
+        return min(max(depth, 1), len(self.label_types))
+
+    def candidates(self, label):
+        """The levels at which `label` is permissible, shallowest first."""
+        mask = self._levels_by_label.get(label, 0)
+        levels = []
+        while mask:
+            low_bit = mask & -mask
+            levels.append(low_bit.bit_length() - 1)
+            mask ^= low_bit
+        return levels
+
+    def label_after(self, level):
+        """The label that would be permissible at `level` after taking the
+        current permissible label there, without changing the depth."""
+        offset = 1 if level < self.open_levels(self.depth) else 0
+        return LABELS.label(self.label_types[level], self.counts[level] + 1 + offset)
+
+    def reset(self, depth):
+        """Go back up to `depth` (e.g. 0 for a heading), clearing the counts
+        of every level below it."""
+        old_depth = self.depth
+        old_open = self.open_levels(old_depth)
+        self.depth = depth
+        new_open = self.open_levels(depth)
+
+        # Levels below the old current one (old_depth - 2) are already 0.
+        first_cleared = max(depth - 1, 0)
+        for level in range(first_cleared, min(old_depth - 1, len(self.label_types))):
+            if self.counts[level]:
+                self.counts[level] = 0
+                self._update_permissible(level)
+        self._cites_valid = min(self._cites_valid, first_cleared)
+
+        for level in range(min(old_open, new_open), max(old_open, new_open)):
+            self._update_permissible(level)
+
+    def advance(self, level):
+        """Take the next label at `level`; returns the new depth."""
+        depth = level + 2
+        if self.depth > depth:
+            self.reset(depth)
+
+        old_open = self.open_levels(self.depth)
+        self.counts[level] += 1
+        self.depth = depth
+        new_open = self.open_levels(depth)
+
+        self._update_permissible(level)
+        for level_changed in range(min(old_open, new_open), max(old_open, new_open)):
+            if level_changed != level:
+                self._update_permissible(level_changed)
+        self._cites_valid = min(self._cites_valid, level)
+        return depth
+
+    def snapshot(self):
+        """A hashable copy of the state, for restore()."""
+        return (self.depth, tuple(self.counts))
+
+    def restore(self, snapshot):
+        self.depth, counts = snapshot
+        self.counts = array("l", counts)
+        for level in range(len(self.label_types)):
+            self._update_permissible(level)
+        self._cites_valid = 0
+
+    def cite(self):
+        """The parenthetical cite of the current position, e.g. "(c)(2)(A)"."""
+        last = self.depth - 2
+        if last < 0:
+            return ""
+        for level in range(self._cites_valid, last + 1):
+            above = self._cites[level - 1] if level else ""
+            label = LABELS.label(self.label_types[level], self.counts[level])
+            self._cites[level] = f"{above}({label})"
+        self._cites_valid = max(self._cites_valid, last + 1)
+        return self._cites[last]
+
+    def _update_permissible(self, level):
+        offset = 1 if level < self.open_levels(self.depth) else 0
+        label = LABELS.label(self.label_types[level], self.counts[level] + offset)
+        old_label = self.permissible[level]
+        if label == old_label:
+            return
+
+        bit = 1 << level
+        if old_label is not None:
+            mask = self._levels_by_label[old_label] & ~bit
+            if mask:
+                self._levels_by_label[old_label] = mask
+            else:
+                del self._levels_by_label[old_label]
+        self._levels_by_label[label] = self._levels_by_label.get(label, 0) | bit
+        self.permissible[level] = label
@@ -0,0 +1,83 @@
+"""In-process cache of rendered statutes for format_statute().
+
+Entries are keyed by a hash of the source text, a canonical hash of
+law_info and the template, so a hit means the output would be identical and
+the whole pipeline can be skipped. The least recently used entries are
+evicted once there are more than `max_entries` of them or their text adds up
+to more than `max_bytes` (counted in characters, which is close enough for
+html).
+"""
+
+import collections
+import hashlib
+import json
+import threading
+
+
+def law_info_digest(law_info):
+    """A hash of law_info that doesn't depend on key order."""
+    canonical = json.dumps(law_info, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries=64, max_bytes=64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, source_text, law_info, template):
+        """`template` identifies the template, including its version (e.g.
+        its name and modification time)."""
+        return (text_digest(source_text), law_info_digest(law_info), template)
+
+    def get(self, key):
+        """The cached html for `key`, or None."""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        size = len(html)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= len(old)
+            self._entries[key] = html
+            self.total_bytes += size
+
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+            }
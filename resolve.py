@@ -0,0 +1,79 @@
+"""Resolution of ambiguous labels for indent_statute().
+
+A label like "(i)" can be permissible at more than one level at once, e.g.
+as the next `lower` label after "(h)" and as the first `romanette` under
+"(A)". `CollisionResolver` decides between them by playing each
+interpretation forward over the next few labels and keeping the one under
+which the most of them are permissible in a row.
+
+Ties (e.g. when the section ends right after the label) are broken
+deterministically, preferring in order:
+    1. continuing a level that already has labels over starting a new one,
+    2. the level closest to the current depth,
+    3. the shallowest level.
+"""
+
+from outline import OutlineState
+
+
+# How many of the following labels are played forward, unless
+# law_info["collision_lookahead"] says otherwise.
+DEFAULT_LOOKAHEAD = 4
+
+
+class CollisionResolver:
+    def __init__(self, label_hierarchy, lookahead=DEFAULT_LOOKAHEAD, memo_size=4096):
+        self.lookahead = lookahead
+        self.memo_size = memo_size
+        # Scratch state for playing interpretations forward.
+        self._scratch = OutlineState(label_hierarchy)
+        self._memo = {}
+
+    def resolve(self, state, levels, upcoming_labels):
+        """Returns the level (one of `levels`) at which to take the current
+        label. `upcoming_labels` are the labels that follow, up to the next
+        heading; only the first `lookahead` of them are considered."""
+
+        window = tuple(upcoming_labels[:self.lookahead])
+        snapshot = state.snapshot()
+        current_level = state.depth - 2
+
+        def preference(level):
+            return (
+                self._score_after(snapshot, level, window),
+                state.counts[level] > 0,
+                -abs(level - current_level),
+                -level,
+            )
+
+        return max(levels, key=preference)
+
+    def _score_after(self, snapshot, level, window):
+        """How many labels of `window` in a row fit after taking the current
+        label at `level`."""
+        scratch = self._scratch
+        scratch.restore(snapshot)
+        scratch.advance(level)
+        return self._score(scratch.snapshot(), window)
+
+    def _score(self, snapshot, window):
+        if not window:
+            return 0
+
+        key = (snapshot, window)
+        score = self._memo.get(key)
+        if score is not None:
+            return score
+
+        scratch = self._scratch
+        scratch.restore(snapshot)
+        score = 0
+        for level in scratch.candidates(window[0]):
+            score = max(score, 1 + self._score_after(snapshot, level, window[1:]))
+            if score == len(window):
+                break
+
+        if len(self._memo) >= self.memo_size:
+            self._memo.clear()
+        self._memo[key] = score
+        return score
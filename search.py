@@ -0,0 +1,361 @@
+"""Full-text search over parsed statutes, with hits at the exact subsection.
+
+`SearchIndex` is a directory holding one segment per document and a
+manifest. A segment is an inverted index of the document's indent_statute()
+output: each provision's text is tokenized, and the postings of each term
+list the provisions it occurs in, with positions, so hits point at anchors
+like "1798.140(v)(1)(A)". Lines without a cite of their own (text without a
+label) count towards the last anchor before them; those before the first
+anchor (the title and other headings) have the anchor "", and their hits
+link to the top of the document.
+
+    index = SearchIndex("search_index")
+    index.add_document("ccpa", indented, href="ccpa.html")
+    for hit in index.search('"personal information" sell*'):
+        print(hit.score, hit.link, hit.text)
+
+Adding a document again replaces its segment only, and is skipped if its
+provisions haven't changed. Queries are words (all must match), "quoted
+phrases" and prefix* terms; hits are ranked by BM25.
+
+A segment (version 1) is zlib-compressed json:
+
+    {"version": 1, "document": ..., "href": ..., "digest": ...,
+     "anchors": [anchor of each provision], "lengths": [tokens in each],
+     "texts": [text of each],
+     "terms": {term: [provision delta, count, position deltas..., ...]}}
+"""
+
+import bisect
+import collections
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import zlib
+
+from atomic import write_atomic
+from crossref import ANCHORED_STYLES
+
+
+VERSION = 1
+
+TOKEN = re.compile(r"\w+")
+QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+
+# A prefix* term matches at most this many terms of each document, the first
+# in alphabetical order.
+MAX_PREFIX_TERMS = 64
+
+
+class Hit(collections.namedtuple("Hit", "score document href anchor text")):
+    __slots__ = ()
+
+    @property
+    def link(self):
+        if not self.anchor:
+            return self.href
+        return f"{self.href}#{self.anchor}"
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN.findall(text)]
+
+
+def indented_digest(indented):
+    digest = hashlib.sha256()
+    for line in indented:
+        digest.update(repr(tuple(line)).encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+def build_segment(document, href, indented):
+    """The segment (as a dict) for one document's indent_statute() output."""
+
+    indented = list(indented)
+    anchors = []
+    lengths = []
+    texts = []
+    # term -> {provision: [positions]}
+    postings = collections.defaultdict(dict)
+
+    anchor = ""
+    for (style, cite, _, label, text) in indented:
+        if style in ANCHORED_STYLES and cite:
+            anchor = cite
+        tokens = tokenize(text)
+        if not tokens:
+            continue
+        provision = len(anchors)
+        anchors.append(anchor)
+        lengths.append(len(tokens))
+        texts.append(f"({label}) {text.strip()}" if label else text.strip())
+        for position, token in enumerate(tokens):
+            postings[token].setdefault(provision, []).append(position)
+
+    terms = {}
+    for term, provisions in postings.items():
+        encoded = []
+        previous = 0
+        for provision, positions in provisions.items():
+            encoded.append(provision - previous)
+            encoded.append(len(positions))
+            last = 0
+            for position in positions:
+                encoded.append(position - last)
+                last = position
+            previous = provision
+        terms[term] = encoded
+
+    return {
+        "version": VERSION,
+        "document": document,
+        "href": href,
+        "digest": indented_digest(indented),
+        "anchors": anchors,
+        "lengths": lengths,
+        "texts": texts,
+        "terms": terms,
+    }
+
+
+class Segment:
+    """A loaded segment. Postings are decoded on first use."""
+
+    def __init__(self, data):
+        if data.get("version", 0) > VERSION:
+            raise ValueError(f"search segment version {data['version']} is newer than {VERSION}")
+        self.document = data["document"]
+        self.href = data["href"]
+        self.anchors = data["anchors"]
+        self.lengths = data["lengths"]
+        self.texts = data["texts"]
+        self._terms = data["terms"]
+        self.sorted_terms = sorted(self._terms)
+        self._decoded = {}
+
+    def postings(self, term):
+        """{provision: [positions]} for `term`."""
+        decoded = self._decoded.get(term)
+        if decoded is None:
+            decoded = {}
+            encoded = self._terms.get(term, ())
+            i = 0
+            provision = 0
+            while i < len(encoded):
+                provision += encoded[i]
+                count = encoded[i + 1]
+                positions = []
+                position = 0
+                for delta in encoded[i + 2:i + 2 + count]:
+                    position += delta
+                    positions.append(position)
+                decoded[provision] = positions
+                i += 2 + count
+            self._decoded[term] = decoded
+        return decoded
+
+    def terms_with_prefix(self, prefix):
+        start = bisect.bisect_left(self.sorted_terms, prefix)
+        terms = []
+        for term in self.sorted_terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def phrase(self, tokens):
+        """{provision: occurrences} of the consecutive `tokens`."""
+        postings = [self.postings(token) for token in tokens]
+        if len(postings) == 1:
+            return {provision: len(positions) for provision, positions in postings[0].items()}
+
+        # Only provisions with every token can have the phrase.
+        candidates = set(min(postings, key=len))
+        for term_postings in postings:
+            candidates &= term_postings.keys()
+
+        found = {}
+        for provision in candidates:
+            starts = set(postings[0][provision])
+            for offset, term_postings in enumerate(postings[1:], 1):
+                starts &= {position - offset for position in term_postings[provision]}
+                if not starts:
+                    break
+            if starts:
+                found[provision] = len(starts)
+        return found
+
+    def prefix(self, prefix):
+        """{provision: occurrences} of any term starting with `prefix`."""
+        found = collections.Counter()
+        for term in self.terms_with_prefix(prefix):
+            found.update({provision: len(positions) for provision, positions in self.postings(term).items()})
+        return found
+
+
+class SearchIndex:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._read_manifest()
+        # document -> Segment, loaded on first query
+        self._segments = {}
+
+    # Building
+
+    def add_document(self, document, indented, href=None):
+        """Indexes (or re-indexes) `document`. Returns False if it was already
+        indexed with the same provisions."""
+
+        indented = list(indented)
+        entry = self.manifest["documents"].get(document)
+        if entry is not None and entry["digest"] == indented_digest(indented):
+            return False
+
+        segment = build_segment(document, href or f"{document}.html", indented)
+        name = self._segment_name(document)
+        data = zlib.compress(json.dumps(segment, separators=(",", ":")).encode())
+        write_atomic(os.path.join(self.directory, name), data)
+
+        self.manifest["documents"][document] = {
+            "segment": name,
+            "href": segment["href"],
+            "digest": segment["digest"],
+            "provisions": len(segment["anchors"]),
+        }
+        self._write_manifest()
+        self._segments.pop(document, None)
+        return True
+
+    def remove_document(self, document):
+        entry = self.manifest["documents"].pop(document, None)
+        if entry is None:
+            return False
+        self._write_manifest()
+        self._segments.pop(document, None)
+        try:
+            os.remove(os.path.join(self.directory, entry["segment"]))
+        except FileNotFoundError:
+            pass
+        return True
+
+    def documents(self):
+        return sorted(self.manifest["documents"])
+
+    # Querying
+
+    def search(self, query, limit=10):
+        """Ranked hits (best first, one per anchor) for `query`: words, which
+        must all occur in a provision, "quoted phrases" and prefix* terms.
+        A prefix matches only the first MAX_PREFIX_TERMS terms starting with
+        it in each document, alphabetically."""
+
+        clauses = []
+        for phrase, word in QUERY.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                if tokens:
+                    clauses.append(("phrase", tokens))
+            elif word.endswith("*") and tokenize(word):
+                clauses.append(("prefix", tokenize(word)[0]))
+            else:
+                clauses.extend(("phrase", [token]) for token in tokenize(word))
+        if not clauses:
+            return []
+
+        segments = self.segments()
+        provisions = sum(len(segment.anchors) for segment in segments)
+        if not provisions:
+            return []
+        average_length = sum(sum(segment.lengths) for segment in segments) / provisions
+
+        # Each clause's matches in each segment, and its document frequency.
+        matches = []
+        for kind, argument in clauses:
+            per_segment = []
+            frequency = 0
+            for segment in segments:
+                if kind == "prefix":
+                    found = segment.prefix(argument)
+                else:
+                    found = segment.phrase(argument)
+                per_segment.append(found)
+                frequency += len(found)
+            if not frequency:
+                return []
+            matches.append((per_segment, frequency))
+
+        idfs = [
+            math.log(1 + (provisions - frequency + 0.5) / (frequency + 0.5))
+            for _, frequency in matches
+        ]
+
+        best = {}
+        for i, segment in enumerate(segments):
+            found = [per_segment[i] for per_segment, _ in matches]
+            candidates = set(min(found, key=len))
+            for clause_found in found:
+                candidates &= clause_found.keys()
+
+            for provision in candidates:
+                norm = K1 * (1 - B + B * segment.lengths[provision] / average_length)
+                score = 0.0
+                for idf, clause_found in zip(idfs, found):
+                    occurrences = clause_found[provision]
+                    score += idf * occurrences * (K1 + 1) / (occurrences + norm)
+
+                key = (i, segment.anchors[provision])
+                if score > best.get(key, (0.0,))[0]:
+                    best[key] = (score, provision)
+
+        top = heapq.nsmallest(
+            limit,
+            best.items(),
+            key=lambda item: (-item[1][0], segments[item[0][0]].document, item[0][1]),
+        )
+        return [
+            Hit(
+                score,
+                segments[i].document,
+                segments[i].href,
+                anchor,
+                segments[i].texts[provision],
+            )
+            for (i, anchor), (score, provision) in top
+        ]
+
+    def segments(self):
+        segments = []
+        for document, entry in sorted(self.manifest["documents"].items()):
+            segment = self._segments.get(document)
+            if segment is None:
+                with open(os.path.join(self.directory, entry["segment"]), "rb") as f:
+                    segment = Segment(json.loads(zlib.decompress(f.read())))
+                self._segments[document] = segment
+            segments.append(segment)
+        return segments
+
+    # Files
+
+    def _segment_name(self, document):
+        return hashlib.sha256(document.encode()).hexdigest()[:24] + ".seg"
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, "manifest.json")) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"version": VERSION, "documents": {}}
+        if manifest.get("version", 0) > VERSION:
+            raise ValueError(f"search index version {manifest['version']} is newer than {VERSION}")
+        return manifest
+
+    def _write_manifest(self):
+        write_atomic(os.path.join(self.directory, "manifest.json"), json.dumps(self.manifest, indent=1).encode())
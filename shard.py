@@ -0,0 +1,139 @@
+"""Parallel rendering of very large codes.
+
+The outline is reset at every heading and each html line depends only on
+its own provision, so a statute can be cut at its headings into shards that
+are indented and linked independently (against the anchors of the whole
+statute). `render_sharded()` cuts the filtered lines into shards of about
+`shard_size` lines (never splitting a section), renders them on a pool of
+processes and joins the results in order, so the output is byte for byte the
+same as render_statute()'s.
+
+    html = shard.format_statute(url, law_info, "index_template_general.html",
+                                shard_size=2000, workers=4)
+"""
+
+import concurrent.futures
+import os
+
+import server
+from crossref import AnchorIndex
+from incremental import split_sections
+
+
+DEFAULT_SHARD_SIZE = 2000
+
+
+def shard_statute(filtered_statute, shard_size=DEFAULT_SHARD_SIZE):
+    """Yields lists of whole sections of at least `shard_size` lines (except
+    maybe the last one)."""
+    shard = []
+    for _, lines in split_sections(filtered_statute):
+        shard.extend(lines)
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def indent_shard(lines, law_info):
+    """Runs in a worker process."""
+    return server.indent_statute(lines, law_info)
+
+
+def link_shards(indented_shards, law_info, anchors, corpus=None):
+    """Runs in a worker process: the html for each shard, as one string per
+    shard so that few objects go back to the parent."""
+    return [
+        "".join(server.iter_hyperlink(indented, law_info, anchors=anchors, corpus=corpus))
+        for indented in indented_shards
+    ]
+
+
+def render_sharded(
+    filtered_statute,
+    law_info,
+    shard_size=DEFAULT_SHARD_SIZE,
+    workers=None,
+    executor=None,
+    corpus=None,
+):
+    """The html lines of the statute (one string per shard). `executor` is a
+    concurrent.futures executor to use instead of a new pool of `workers`
+    processes.
+
+    Cites are linked against the anchors of the whole statute, so this runs
+    in two rounds: the shards are indented, the anchors of all of them are
+    collected, and then the shards are linked, in one batch per worker so the
+    anchors are sent to each worker once.
+    """
+
+    shards = list(shard_statute(filtered_statute, shard_size))
+
+    # Not worth starting processes for.
+    if len(shards) <= 1 or workers == 1:
+        indented_shards = [indent_shard(lines, law_info) for lines in shards]
+        anchors = collect_anchors(indented_shards)
+        return link_shards(indented_shards, law_info, anchors, corpus)
+
+    workers = min(workers or os.cpu_count() or 1, len(shards))
+    if executor is not None:
+        return _render_sharded(executor, shards, law_info, workers, corpus)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return _render_sharded(pool, shards, law_info, workers, corpus)
+
+
+def _render_sharded(pool, shards, law_info, workers, corpus):
+    indented_shards = list(pool.map(indent_shard, shards, [law_info] * len(shards)))
+    anchors = collect_anchors(indented_shards)
+
+    size = -(-len(indented_shards) // workers)
+    batches = [indented_shards[i:i + size] for i in range(0, len(indented_shards), size)]
+    linked = pool.map(
+        link_shards,
+        batches,
+        [law_info] * len(batches),
+        [anchors] * len(batches),
+        [corpus] * len(batches),
+    )
+    return [html for batch in linked for html in batch]
+
+
+def collect_anchors(indented_shards):
+    anchors = AnchorIndex()
+    for indented in indented_shards:
+        anchors.update(AnchorIndex.from_indented(indented))
+    return anchors
+
+
+def render_statute(
+    filtered_statute,
+    law_info,
+    template,
+    shard_size=DEFAULT_SHARD_SIZE,
+    workers=None,
+    executor=None,
+    corpus=None,
+):
+    """server.render_statute(), rendering the shards in parallel."""
+    title = server.statute_title(filtered_statute, law_info)
+    new_html = render_sharded(filtered_statute, law_info, shard_size, workers, executor, corpus)
+    return server.fill_template(template, title, new_html)
+
+
+def format_statute(
+    law_text,
+    law_info,
+    template,
+    shard_size=DEFAULT_SHARD_SIZE,
+    workers=None,
+    executor=None,
+    http_cache=None,
+    corpus=None,
+):
+    """server.format_statute(), rendering the shards in parallel."""
+    source_text = server.read_source(law_text, http_cache)
+    filtered_statute = list(server.filter_source(law_text, source_text, law_info))
+    return render_statute(
+        filtered_statute, law_info, template, shard_size, workers, executor, corpus
+    )
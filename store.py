@@ -0,0 +1,351 @@
+"""Persistent store of fetched pages and parse stages, in one SQLite file.
+
+Unlike the in-process RenderCache, the store survives restarts, so a new
+process doesn't fetch and parse every code again. Raw pages are stored
+content-addressed, by the hash of their text; the stages of the pipeline
+are stored per source hash and law_info hash:
+
+    "filtered"  filter_html() / filter_txt() output
+    "indented"  indent_statute() output
+    "html"      the formatted statute, per template version (and corpus)
+
+    stages = StageStore("statutes.sqlite")
+    html = format_statute(url, law_info, "index_template_general.html", stages)
+
+A URL is fetched only if no page is stored for it, or the stored one was
+fetched more than `max_age` seconds ago (None, the default, never expires
+it; 0 always fetches). Files are always read, since that is cheap and they
+may have changed. format_statute() then resumes from the deepest stage
+stored for the page and law_info: the html if there is one, otherwise it
+renders from the stored indentation and filtered lines (e.g. with a new
+template), filtering the page only when there is nothing. Every stage is
+keyed by the whole law_info, since filter_txt() depends on it too.
+All the stages of a source are read in one query and the missing ones
+written in one transaction; `transaction()` batches the writes of several
+sources.
+
+Pages are kept while a source (a URL or file name) refers to them; `gc()`
+forgets sources not used for `max_age` seconds and deletes the pages and
+stages no source refers to any more.
+
+Schema (version 2, which added sources.fetched):
+
+    pages(hash, body)                       body is zlib-compressed utf-8
+    sources(source, hash, used, fetched)    times in seconds since the epoch
+    stages(source_hash, law_info_hash, stage, variant, data)
+                                            data is zlib-compressed json
+                                            (utf-8 for "html"); variant is
+                                            the template version for "html"
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import server
+from render_cache import law_info_digest, text_digest
+from template import load_template
+
+
+VERSION = 2
+
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "statute_parse", "stages.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (hash TEXT PRIMARY KEY, body BLOB NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY, hash TEXT NOT NULL, used REAL NOT NULL, fetched REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sources_hash ON sources (hash);
+CREATE TABLE IF NOT EXISTS stages (
+    source_hash TEXT NOT NULL,
+    law_info_hash TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (source_hash, law_info_hash, stage, variant)
+) WITHOUT ROWID;
+"""
+
+
+def encode_stage(stage, value):
+    if stage == "html":
+        data = value.encode("utf-8", "surrogatepass")
+    else:
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogatepass")
+    return zlib.compress(data)
+
+
+def decode_stage(stage, data):
+    text = zlib.decompress(data).decode("utf-8", "surrogatepass")
+    if stage == "html":
+        return text
+    return [tuple(line) for line in json.loads(text)]
+
+
+class StageStore:
+    """One SQLite file. Each thread gets its own connection, so a store can
+    be shared by threads; processes should each open the file themselves
+    (see open_store())."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # executescript() commits first, so it can't be in the transaction.
+        self._connection().executescript(SCHEMA)
+        with self.transaction() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None:
+                db.execute("INSERT INTO meta VALUES ('version', ?)", (str(VERSION),))
+            elif int(row[0]) > VERSION:
+                raise ValueError(f"stage store version {row[0]} is newer than {VERSION}")
+            elif int(row[0]) == 1:
+                # Version 1 didn't record fetch times, so its pages count as stale.
+                db.execute("ALTER TABLE sources ADD COLUMN fetched REAL NOT NULL DEFAULT 0")
+                db.execute("UPDATE meta SET value = ? WHERE key = 'version'", (str(VERSION),))
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Transactions are explicit, see transaction().
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            self._local.db = db
+            self._local.depth = 0
+        return db
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Everything written inside is committed at once, at the end of the
+        outermost transaction() (or not at all, on an exception)."""
+        db = self._connection()
+        if self._local.depth == 0:
+            db.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield db
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                db.execute("ROLLBACK")
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            db.execute("COMMIT")
+
+    def close(self):
+        """Closes this thread's connection."""
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    # Pages
+
+    def put_page(self, source, text):
+        """Stores the text of `source`, just fetched or read (unless a page
+        with the same text is already stored), and makes it the page `source`
+        refers to. Returns its hash."""
+        digest = text_digest(text)
+        with self.transaction() as db:
+            if db.execute("SELECT 1 FROM pages WHERE hash = ?", (digest,)).fetchone() is None:
+                db.execute(
+                    "INSERT INTO pages VALUES (?, ?)",
+                    (digest, zlib.compress(text.encode("utf-8", "surrogatepass"))),
+                )
+            now = time.time()
+            db.execute(
+                "INSERT OR REPLACE INTO sources (source, hash, used, fetched) VALUES (?, ?, ?, ?)",
+                (source, digest, now, now),
+            )
+        return digest
+
+    def touch(self, source):
+        """Marks `source` as used, for gc()."""
+        with self.transaction() as db:
+            db.execute("UPDATE sources SET used = ? WHERE source = ?", (time.time(), source))
+
+    def page(self, digest):
+        """The text of the page with hash `digest`, or None."""
+        row = self._connection().execute("SELECT body FROM pages WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]).decode("utf-8", "surrogatepass")
+
+    def source_page(self, source, max_age=None):
+        """The hash of the page last stored for `source`, or None if there is
+        none or it was fetched more than `max_age` seconds ago."""
+        row = self._connection().execute(
+            "SELECT hash, fetched FROM sources WHERE source = ?", (source,)
+        ).fetchone()
+        if row is None or (max_age is not None and row[1] < time.time() - max_age):
+            return None
+        return row[0]
+
+    # Stages
+
+    def get_stages(self, source_hash, law_info_hash, variant):
+        """{stage: value} of the stages stored for the source and law_info
+        (with the html for `variant`). If there is html, the earlier stages
+        aren't needed, so only it is returned."""
+        rows = dict(self._connection().execute(
+            "SELECT stage, data FROM stages WHERE source_hash = ? AND law_info_hash = ?"
+            " AND variant = (CASE stage WHEN 'html' THEN ? ELSE '' END)",
+            (source_hash, law_info_hash, variant),
+        ).fetchall())
+        if "html" in rows:
+            rows = {"html": rows["html"]}
+        return {stage: decode_stage(stage, data) for stage, data in rows.items()}
+
+    def put_stages(self, source_hash, law_info_hash, variant, stages):
+        """Stores the {stage: value} `stages` in one transaction."""
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        source_hash,
+                        law_info_hash,
+                        stage,
+                        variant if stage == "html" else "",
+                        encode_stage(stage, value),
+                    )
+                    for stage, value in stages.items()
+                ],
+            )
+
+    # Maintenance
+
+    def gc(self, max_age=None, vacuum=False):
+        """Forgets sources not stored for `max_age` seconds (if given), then
+        deletes the pages and stages no source refers to. Returns the number
+        of sources, pages and stages deleted."""
+        with self.transaction() as db:
+            sources = 0
+            if max_age is not None:
+                sources = db.execute(
+                    "DELETE FROM sources WHERE used < ?", (time.time() - max_age,)
+                ).rowcount
+            pages = db.execute(
+                "DELETE FROM pages WHERE hash NOT IN (SELECT hash FROM sources)"
+            ).rowcount
+            stages = db.execute(
+                "DELETE FROM stages WHERE source_hash NOT IN (SELECT hash FROM pages)"
+            ).rowcount
+        if vacuum:
+            db = self._connection()
+            db.execute("VACUUM")
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"sources": sources, "pages": pages, "stages": stages}
+
+    def stats(self):
+        db = self._connection()
+        counts = {
+            table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("sources", "pages", "stages")
+        }
+        counts["bytes"] = os.path.getsize(self.path)
+        return counts
+
+
+_open_stores = {}
+
+
+def open_store(path):
+    """The StageStore at `path`, opened once per process (e.g. in workers)."""
+    stages = _open_stores.get(path)
+    if stages is None:
+        stages = _open_stores[path] = StageStore(path)
+    return stages
+
+
+def html_variant(template, corpus=None):
+    """Identifies what the html depends on besides the source and law_info."""
+    name, mtime_ns = server.template_version(template)
+    variant = f"{name}@{mtime_ns}"
+    if corpus is not None:
+        variant += f"+{corpus.digest()}"
+    return variant
+
+
+def render_source(stages, law_text, source_text, law_info, template, corpus=None):
+    """The formatted statute for `source_text`, the text of `law_text` just
+    fetched or read, resuming from the deepest stage in `stages` and storing
+    the page and the rest."""
+    return _render(stages, law_text, text_digest(source_text), law_info, template, corpus, source_text)
+
+
+def render_stored(stages, law_text, source_hash, law_info, template, corpus=None):
+    """render_source() for the page with hash `source_hash`, already stored
+    for `law_text`. The page itself is only read if no stage is stored."""
+    return _render(stages, law_text, source_hash, law_info, template, corpus)
+
+
+def _render(stages, law_text, source_hash, law_info, template, corpus, source_text=None):
+    law_info_hash = law_info_digest(law_info)
+    variant = html_variant(template, corpus)
+
+    stored = stages.get_stages(source_hash, law_info_hash, variant)
+    new = {}
+    if "html" in stored:
+        html = stored["html"]
+    else:
+        filtered_statute = stored.get("filtered")
+        if filtered_statute is None:
+            text = source_text if source_text is not None else stages.page(source_hash)
+            filtered_statute = new["filtered"] = list(server.filter_source(law_text, text, law_info))
+        indented = stored.get("indented")
+        if indented is None:
+            indented = new["indented"] = server.indent_statute(filtered_statute, law_info)
+
+        title = server.statute_title(filtered_statute, law_info)
+        new_html = server.hyperlink(indented, law_info, corpus=corpus)
+        html = new["html"] = load_template(template).render(title, new_html)
+
+    with stages.transaction():
+        if source_text is not None:
+            stages.put_page(law_text, source_text)
+        else:
+            # Only marks the source as used, for gc().
+            stages.touch(law_text)
+        if new:
+            stages.put_stages(source_hash, law_info_hash, variant, new)
+    return html
+
+
+def stored_page(stages, law_text, max_age=None):
+    """The hash of the page stored for `law_text` if it is a URL and the page
+    is recent enough to use instead of fetching it again; None otherwise."""
+    if not law_text.startswith("http"):
+        return None
+    return stages.source_page(law_text, max_age)
+
+
+def format_statute(law_text, law_info, template, stages, http_cache=None, corpus=None, max_age=None):
+    """server.format_statute() through a StageStore. A URL is fetched only if
+    no page fetched in the last `max_age` seconds is stored for it."""
+    source_hash = stored_page(stages, law_text, max_age)
+    if source_hash is not None:
+        return render_stored(stages, law_text, source_hash, law_info, template, corpus)
+    source_text = server.read_source(law_text, http_cache)
+    return render_source(stages, law_text, source_text, law_info, template, corpus)
+
+
+def convert(path, law_text, source_text, law_info, template, max_age=None):
+    """In a worker process, with the store at `path`: render_source(), or
+    format_statute() if `source_text` is None."""
+    stages = open_store(path)
+    if source_text is None:
+        return format_statute(law_text, law_info, template, stages, max_age=max_age)
+    return render_source(stages, law_text, source_text, law_info, template)
@@ -0,0 +1,89 @@
+"""Output templates, compiled once.
+
+A template is an html file with two markers: "[~~TITLE~~]", replaced by the
+statute's title, and "=========HERE===========", replaced by the statute
+itself. `load_template()` splits the file at the markers once (and again only
+when it is modified), so rendering is just writing the pieces in order: no
+regex pass over the template, no copy of the document per substitution, and
+backslashes in the statute or title are written as they are.
+"""
+
+import functools
+import os
+
+
+TITLE = "[~~TITLE~~]"
+BODY = "=========HERE==========="
+
+TEMPLATE_DIRECTORY = "templates"
+
+
+class Template:
+    def __init__(self, text):
+        # Alternating literal text and markers: the markers are the TITLE and
+        # BODY objects themselves, so `is` tells them from equal text.
+        self.pieces = []
+        for i, part in enumerate(text.split(BODY)):
+            if i:
+                self.pieces.append(BODY)
+            for j, literal in enumerate(part.split(TITLE)):
+                if j:
+                    self.pieces.append(TITLE)
+                if literal:
+                    self.pieces.append(literal)
+
+        # head and tail around the first BODY, for streaming.
+        first_body = next(
+            (i for i, piece in enumerate(self.pieces) if piece is BODY), len(self.pieces)
+        )
+        self.head = self.pieces[:first_body]
+        self.tail = self.pieces[first_body + 1:]
+
+    def write(self, sink, title, body):
+        """Writes the whole document to `sink`. `body` is a list of html
+        lines (it is written at every BODY marker)."""
+        for piece in self.pieces:
+            if piece is BODY:
+                for line in body:
+                    sink.write(line)
+            else:
+                sink.write(title if piece is TITLE else piece)
+
+    def write_head(self, sink, title):
+        self._write_literal(sink, self.head, title)
+
+    def write_tail(self, sink, title):
+        self._write_literal(sink, self.tail, title)
+
+    def render(self, title, body):
+        """The whole document as a string."""
+        parts = []
+        for piece in self.pieces:
+            if piece is BODY:
+                parts.extend(body)
+            else:
+                parts.append(title if piece is TITLE else piece)
+        return "".join(parts)
+
+    def _write_literal(self, sink, pieces, title):
+        for piece in pieces:
+            if piece is BODY:
+                # Only the first BODY marker is streamed into.
+                continue
+            sink.write(title if piece is TITLE else piece)
+
+
+def template_path(name):
+    return os.path.join(TEMPLATE_DIRECTORY, name)
+
+
+def load_template(name):
+    """The compiled template `name` in the templates directory."""
+    path = template_path(name)
+    return _compile(path, os.stat(path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=16)
+def _compile(path, mtime_ns):
+    with open(path, encoding="utf-8") as f:
+        return Template(f.read())
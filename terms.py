@@ -0,0 +1,131 @@
+"""Defined-term linking for hyperlink().
+
+`term_linker(law_info)` builds (once per set of defined terms) a `TermLinker`
+holding an Aho-Corasick automaton over every defined term and its
+capitalized form. `TermLinker.link()` then finds all the terms in a line in a
+single pass, links the longest match at each position, and leaves text that
+is already inside an <a> tag (or inside a tag) alone.
+"""
+
+import functools
+import re
+
+
+# Existing links and bare tags; terms are only linked in the text between them.
+PROTECTED = re.compile(r"<a\b.*?</a>|<[^>]*>", re.DOTALL | re.IGNORECASE)
+
+
+class TermLinker:
+    """Links every occurrence of the defined terms in a line of html.
+
+    `terms` maps a term to the href it links to. Superterms take precedence
+    over subterms with the same spelling; otherwise the longest match wins,
+    so "personal information" is linked as a whole rather than "information".
+    """
+
+    def __init__(self, defined_superterms, defined_subterms):
+        terms = {}
+        for defined_terms in (defined_subterms, defined_superterms):
+            for term, href in defined_terms.items():
+                if term:
+                    terms[term] = href
+                    terms[term.capitalize()] = href
+        self.terms = terms
+
+        # goto[node] maps a character to the next node, fail[node] is the
+        # longest proper suffix that is also a node, and match[node] is the
+        # term ending at node (or None). dict_suffix[node] is the nearest
+        # node on the fail chain that ends a term.
+        self.goto = [{}]
+        self.fail = [0]
+        self.match = [None]
+        self.dict_suffix = [0]
+
+        for term in terms:
+            node = 0
+            for char in term:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.match.append(None)
+                    self.dict_suffix.append(0)
+                node = next_node
+            self.match[node] = term
+
+        # Breadth-first, so that every fail target is finished before use.
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[child] = target
+                self.dict_suffix[child] = (
+                    target if self.match[target] is not None else self.dict_suffix[target]
+                )
+                queue.append(child)
+
+    def link(self, line):
+        """Returns `line` with the defined terms linked."""
+        if not self.terms:
+            return line
+
+        pieces = []
+        position = 0
+        for protected in PROTECTED.finditer(line):
+            pieces.append(self._link_text(line[position:protected.start()]))
+            pieces.append(protected.group())
+            position = protected.end()
+        pieces.append(self._link_text(line[position:]))
+        return "".join(pieces)
+
+    def _link_text(self, text):
+        """Links terms in text that contains no tags."""
+
+        # longest[start] is the length of the longest term starting at start.
+        longest = {}
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+
+            found = node if self.match[node] is not None else self.dict_suffix[node]
+            while found:
+                length = len(self.match[found])
+                start = end - length
+                if length > longest.get(start, 0):
+                    longest[start] = length
+                found = self.dict_suffix[found]
+
+        if not longest:
+            return text
+
+        pieces = []
+        position = 0
+        for start in sorted(longest):
+            if start < position:
+                continue
+            term = text[start:start + longest[start]]
+            pieces.append(text[position:start])
+            pieces.append(f'<a href = "{self.terms[term]}" class = "clean">{term}</a>')
+            position = start + len(term)
+        pieces.append(text[position:])
+        return "".join(pieces)
+
+
+def term_linker(law_info):
+    """The TermLinker for law_info's defined terms, built once per set of terms."""
+    return _cached_term_linker(
+        tuple(law_info.get("defined_superterms", {}).items()),
+        tuple(law_info.get("defined_subterms", {}).items()),
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_term_linker(defined_superterms, defined_subterms):
+    return TermLinker(dict(defined_superterms), dict(defined_subterms))
@@ -0,0 +1,108 @@
+"""Records what the original server.py made of generated statutes, for
+test_pipeline.py to compare the current code against.
+
+    python tests/make_baseline.py 42274fa
+
+runs server.py as of the given commit (the baseline, before any of the
+optimizations) on CASES and writes tests/data/baseline.json: the label
+tables of get_labels(), and for each case digests of the indent_statute()
+output (from the html and the text version) and of the hyperlink() output.
+
+The cases have no label collisions: the baseline resolved those wrongly (see
+resolve.py), so they are checked against the generator's own cites instead.
+"""
+
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "baseline.json")
+
+LABEL_TYPES = ["lower", "arabic", "capital", "romanette", "roman", "lower2"]
+
+KNOBS = [
+    {},
+    {"subsections": 0.5},
+    {"depth": 5, "breadth": 6},
+    {"term_density": 0.3},
+]
+
+CASES = [dict(knobs, collisions=0, seed=seed) for seed in range(20) for knobs in KNOBS]
+
+SECTIONS = 3
+
+
+def case_name(knobs):
+    return ",".join(f"{name}={value}" for name, value in sorted(knobs.items()))
+
+
+def case_files(directory, knobs):
+    """Writes the statute of a case. Returns (html path, txt path, law_info)."""
+    return generate.generate(os.path.join(directory, case_name(knobs)), SECTIONS, **knobs)
+
+
+def digest(value):
+    if not isinstance(value, str):
+        value = json.dumps([list(line) for line in value])
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def load_server(commit):
+    """server.py as of `commit`, imported under another name."""
+    source = subprocess.run(
+        ["git", "show", f"{commit}:server.py"], cwd=ROOT, check=True, capture_output=True
+    ).stdout
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "baseline_server.py")
+    with open(path, "wb") as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location("baseline_server", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def record(baseline, directory):
+    cases = {}
+    for knobs in CASES:
+        html_path, txt_path, law_info = case_files(directory, knobs)
+        with open(html_path, encoding="utf-8") as f:
+            html_content = f.read()
+        # The baseline printed its working as it went.
+        with contextlib.redirect_stdout(io.StringIO()):
+            indented = baseline.indent_statute(baseline.filter_html(html_content), law_info)
+            indented_txt = baseline.indent_statute(baseline.filter_txt(txt_path, law_info), law_info)
+        cases[case_name(knobs)] = {
+            "indent_statute": digest(indented),
+            "indent_statute_txt": digest(indented_txt),
+            "hyperlink": digest("".join(baseline.hyperlink(indented, law_info))),
+        }
+    return {
+        "labels": {label_type: list(baseline.get_labels(label_type)) for label_type in LABEL_TYPES},
+        "cases": cases,
+    }
+
+
+if __name__ == "__main__":
+    commit = sys.argv[1] if len(sys.argv) > 1 else "42274fa"
+    baseline = load_server(commit)
+    with tempfile.TemporaryDirectory() as directory:
+        recorded = record(baseline, directory)
+    recorded["commit"] = commit
+    os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+    with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+        json.dump(recorded, f, indent=1, sort_keys=True)
+        f.write("\n")
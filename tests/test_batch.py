@@ -0,0 +1,62 @@
+"""Batch conversion of a manifest.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import batch  # noqa: E402
+import generate  # noqa: E402
+
+
+class RunBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        # The templates are found relative to the working directory.
+        os.chdir(ROOT)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.out_dir = os.path.join(directory.name, "out")
+        self.html_path, self.txt_path, law_info = generate.generate(os.path.join(directory.name, "a"), 3)
+        self.law_info = dict(law_info, label_hierarchy=list(law_info["label_hierarchy"].values()))
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def run_batch(self, items):
+        for item in items:
+            item["law_info"] = self.law_info
+        return batch.run_batch(items, out_dir=self.out_dir, workers=1, report=lambda line: None)
+
+    def test_clashing_names_get_a_counter(self):
+        results = self.run_batch([{"source": self.txt_path}, {"source": self.html_path}])
+        self.assertEqual([result["error"] for result in results], [None, None])
+        self.assertEqual(
+            [os.path.basename(result["output"]) for result in results], ["a.html", "a_2.html"]
+        )
+        for result in results:
+            self.assertEqual(os.path.getsize(result["output"]), result["bytes"])
+
+    def test_a_shared_explicit_output_is_an_error(self):
+        output = os.path.join(self.out_dir, "a.html")
+        results = self.run_batch([
+            {"source": self.txt_path, "output": output},
+            {"source": self.html_path, "output": output},
+            {"source": self.html_path},
+        ])
+        self.assertEqual(
+            [result["error"] for result in results], [f"2 items have the output {output}"] * 2 + [None]
+        )
+        self.assertEqual(os.path.basename(results[2]["output"]), "a_2.html")
+        self.assertFalse(os.path.exists(output))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""Crawling a recorded site, with an interruption.
+
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import crawl  # noqa: E402
+import generate  # noqa: E402
+
+
+LEGINFO = "https://leginfo.legislature.ca.gov"
+START_URL = f"{LEGINFO}/faces/codesTOCSelected.xhtml?tocCode=CIV"
+
+
+def branch_url(title):
+    return f"{LEGINFO}/faces/codes_displayexpandedbranch.xhtml?tocCode=CIV&title={title}"
+
+
+def leaf_url(title, article):
+    return f"{LEGINFO}/faces/codes_displayText.xhtml?lawCode=CIV&title={title}&article={article}"
+
+
+def links(urls):
+    return "".join(f'<a href="{url}">{url}</a>\n' for url in urls)
+
+
+def record_site(directory):
+    """Records a code with two titles of three articles each, as crawling it
+    with `record_dir` would. Returns the leaf URLs."""
+    pages = {START_URL: links([branch_url(1), branch_url(2), "https://example.com/elsewhere"])}
+    leaves = []
+    for title in (1, 2):
+        # A relative link too, and one back up the outline.
+        title_leaves = [leaf_url(title, article) for article in range(3)]
+        pages[branch_url(title)] = links(title_leaves[:2] + [START_URL]) + (
+            f'<a href="codes_displayText.xhtml?lawCode=CIV&title={title}&article=2">2</a>'
+        )
+        leaves += title_leaves
+    for number, url in enumerate(leaves):
+        pages[url] = generate.to_html(generate.Generator(seed=number).statute(2))
+    for url, page in pages.items():
+        with open(os.path.join(directory, crawl.recorded_name(url)), "w", encoding="utf-8") as f:
+            f.write(page)
+    return leaves
+
+
+class Interrupted(BaseException):
+    """Stands in for ^C."""
+
+
+class CrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        # The templates are found relative to the working directory.
+        os.chdir(ROOT)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.recorded = os.path.join(self.directory, "recorded")
+        os.mkdir(self.recorded)
+        self.leaves = record_site(self.recorded)
+        self.site = crawl.RecordedSite(self.recorded)
+        self.addCleanup(self.site.close)
+        self.start_url = self.site.url_for(START_URL)
+        self.state_path = os.path.join(self.directory, "state.json")
+        self.out_dir = os.path.join(self.directory, "out")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def crawler(self, fetched, interrupt_after=None):
+        crawler = crawl.Crawler(
+            self.start_url,
+            self.state_path,
+            self.out_dir,
+            concurrency=2,
+            delay=0,
+            workers=1,
+            law_info=generate.law_info(),
+            cache_dir=os.path.join(self.directory, "cache"),
+            checkpoint_every=1,
+            report=lambda line: None,
+        )
+        fetch = crawler.fetch
+
+        def counting_fetch(url):
+            if interrupt_after is not None and len(fetched) >= interrupt_after:
+                raise Interrupted()
+            fetched.append(url)
+            return fetch(url)
+
+        crawler.fetch = counting_fetch
+        return crawler
+
+    def test_interrupted_crawl_resumes(self):
+        first = []
+        with self.assertRaises(Interrupted):
+            self.crawler(first, interrupt_after=5).run()
+        with open(self.state_path) as f:
+            saved = json.load(f)
+        finished = set(saved["done"])
+        self.assertIn(self.start_url, finished)
+        self.assertLess(len(finished), 1 + 2 + len(self.leaves))
+
+        second = []
+        state = self.crawler(second).run()
+
+        # Nothing finished before the interruption is fetched again.
+        self.assertFalse(finished & set(second))
+        leaves = [self.site.url_for(url) for url in self.leaves]
+        self.assertEqual(sorted(url for url, kind in state.discovered.items() if kind == "leaf"), sorted(leaves))
+        self.assertEqual(set(state.done), set(state.discovered))
+        self.assertEqual(state.failed, {})
+        for url in leaves:
+            with open(state.done[url], encoding="utf-8") as f:
+                self.assertIn("1798.100", f.read())
+
+        # Run again, there's nothing left to do.
+        third = []
+        self.crawler(third).run()
+        self.assertEqual(third, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
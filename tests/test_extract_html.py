@@ -0,0 +1,91 @@
+"""The html backends agree with the original BeautifulSoup parse.
+
+    python -m unittest discover tests
+"""
+
+import os
+import random
+import re
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+from extract_html import HTML_BACKENDS  # noqa: E402
+
+
+# Put between the tags and text of a generated page. Character references
+# are well-formed; see extract_html.
+NOISE = [
+    "<div>", "</div>", "<span>", "</span>", "<b>", "</b>", "<table><tr><td>",
+    "</h6>", "</h4>", "</p>", "</td>", "</nope>",
+    "  ", " stray text ", "\t", "&nbsp;", "&amp;", "&#167;", "&#x2014;", "&#32;&#32;",
+    "<!-- a comment -->", "<![CDATA[cdata]]>", "<!DOCTYPE html>", "<?php echo 1 ?>",
+    "<script>var heading = '<h6>';</script>", "<style>p { margin: 0 }</style>",
+    "<br>", "</br>", "<br/>", "<img src=x>", "<p/>",
+    "<ruby>kan<rp>(</rp><rt>ji</rt><rp>)</rp></ruby>",
+    "<template><p>template</p><![CDATA[in a template]]></template>",
+    "<pre>  kept  </pre>", "<textarea> </textarea>",
+]
+
+TOKEN = re.compile(r"<[^>]*>|[^<]+")
+
+
+def noisy_page(seed, sections=3):
+    """A generated statute page, with noise between its tags and text."""
+    rng = random.Random(seed)
+    lines = generate.Generator(seed=seed).statute(sections)
+    tokens = TOKEN.findall(generate.to_html(lines))
+    out = []
+    for token in tokens:
+        while rng.random() < 0.3:
+            out.append(rng.choice(NOISE))
+        out.append(token)
+    return "".join(out)
+
+
+def chunked(text, rng):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 64)
+        yield text[position:position + size]
+        position += size
+
+
+class BackendEquivalenceTest(unittest.TestCase):
+    def test_backends(self):
+        self.assertEqual(sorted(HTML_BACKENDS), ["soup", "stream"])
+
+    def test_generated_pages(self):
+        for seed in range(200):
+            page = noisy_page(seed)
+            expected = server.filter_html(page, "soup")
+            with self.subTest(seed=seed):
+                self.assertEqual(server.filter_html(page, "stream"), expected)
+                chunks = list(chunked(page, random.Random(seed)))
+                self.assertEqual(server.filter_html(chunks, "stream"), expected)
+
+    def test_closing_an_enclosing_element_closes_the_heading(self):
+        page = "<div><h6>1798.100.</div> not part of the heading<h4>TITLE 1.81.5</h4>"
+        for backend in HTML_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(
+                    server.filter_html(page, backend),
+                    [("law_heading", "1798.100", "1798.100."), ("title", "", "TITLE 1.81.5")],
+                )
+
+    def test_cdata_is_text(self):
+        page = '<p style="margin:0;display:inline;">(a) <![CDATA[cdata]]> text</p>'
+        for backend in HTML_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(
+                    server.filter_html(page, backend), [("paragraph", "", "(a) cdata text")]
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""Incremental re-rendering agrees with rendering the whole statute.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+from incremental import IncrementalRenderer  # noqa: E402
+
+
+def section(number, *paragraphs):
+    """The filtered lines of a section."""
+    return [("law_heading", number, f"{number}.")] + [("paragraph", "", text) for text in paragraphs]
+
+
+ACCESS = section(
+    "1798.100",
+    "(a) A consumer may request the personal information described in Section 1798.140(b).",
+    "(b) A business shall comply within 45 days.",
+)
+OPT_OUT = section("1798.120", "(a) A consumer may opt out of the sale of personal information.")
+DEFINITIONS = section(
+    "1798.140",
+    "(a) Business means a legal entity.",
+    "(b) Personal information means information that identifies a consumer.",
+)
+PENALTIES = section("1798.155", "(a) A business that violates Section 1798.120(a) is liable.")
+
+
+class IncrementalRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.law_info = generate.law_info()
+        self.renderer = IncrementalRenderer(self.law_info)
+
+    def render(self, *sections):
+        """Renders the statute incrementally, checking that it comes out as a
+        full render would. Returns the report."""
+        filtered = [line for lines in sections for line in lines]
+        html, report = self.renderer.render(filtered)
+        self.assertEqual(html, server.hyperlink(server.indent_statute(filtered, self.law_info), self.law_info))
+        return report
+
+    def test_only_what_changed_is_rendered_again(self):
+        report = self.render(ACCESS, OPT_OUT, DEFINITIONS, PENALTIES)
+        self.assertEqual(report["added"], ["1798.100", "1798.120", "1798.140", "1798.155"])
+        self.assertEqual(report["reused"], 0)
+
+        # A definition is edited and the opt out repealed: the penalties
+        # section still cites it, and is linked again without the link.
+        definitions = DEFINITIONS[:2] + [("paragraph", "", "(b) Personal information means any information.")]
+        report = self.render(ACCESS, definitions, PENALTIES)
+        self.assertEqual(
+            report,
+            {
+                "changed": ["1798.140"],
+                "added": [],
+                "removed": ["1798.120"],
+                "relinked": ["1798.155"],
+                "reused": 1,
+            },
+        )
+
+        # A new cite to the repealed section links nowhere.
+        access = ACCESS + [("paragraph", "", "(c) Section 1798.120 does not apply.")]
+        report = self.render(access, definitions, PENALTIES)
+        self.assertEqual(
+            report,
+            {"changed": ["1798.100"], "added": [], "removed": [], "relinked": [], "reused": 2},
+        )
+
+        # Restored, it's linked from both.
+        report = self.render(access, OPT_OUT, definitions, PENALTIES)
+        self.assertEqual(
+            report,
+            {"changed": [], "added": ["1798.120"], "removed": [], "relinked": ["1798.100", "1798.155"], "reused": 1},
+        )
+
+    def test_nothing_changed(self):
+        self.render(ACCESS, OPT_OUT)
+        report = self.render(ACCESS, OPT_OUT)
+        self.assertEqual(report, {"changed": [], "added": [], "removed": [], "relinked": [], "reused": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Stored statutes read back as they were written.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+import intermediate  # noqa: E402
+import server  # noqa: E402
+
+
+TEMPLATE = "index_template_general.html"
+
+
+class StoredStatuteTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        # The templates are found relative to the working directory.
+        os.chdir(ROOT)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.html_path, _, self.law_info = generate.generate(os.path.join(self.directory, "statute"), 5)
+        self.law_info["title"] = "Loi sur la vie privée"
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def test_round_trip(self):
+        expected = server.format_statute(self.html_path, self.law_info, TEMPLATE, "")
+        with open(self.html_path, encoding="utf-8") as f:
+            indented = server.indent_statute(server.filter_html(f.read()), self.law_info)
+        for extension in ("jsonl", "stix"):
+            with self.subTest(extension=extension):
+                path = os.path.join(self.directory, f"statute.{extension}")
+                intermediate.parse_to_file(self.html_path, self.law_info, path)
+                stored = intermediate.read_indented(path)
+                self.assertEqual(list(stored), [tuple(line) for line in indented])
+                self.assertEqual(stored.law_info, self.law_info)
+                self.assertEqual(intermediate.render_stored(path, TEMPLATE), expected)
+
+    def test_header_is_not_escaped(self):
+        path = os.path.join(self.directory, "statute.jsonl")
+        intermediate.parse_to_file(self.html_path, self.law_info, path)
+        with open(path, encoding="utf-8") as f:
+            self.assertIn("privée", f.readline())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""The parsing pipeline agrees with the original server.py.
+
+    python -m unittest discover tests
+
+tests/data/baseline.json is what the baseline made of the same generated
+statutes; see make_baseline.py.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+from classify import LINE_CLASSIFIER  # noqa: E402
+from labels import LABELS  # noqa: E402
+from make_baseline import BASELINE_PATH, CASES, case_files, case_name, digest  # noqa: E402
+
+
+with open(BASELINE_PATH, encoding="utf-8") as f:
+    BASELINE = json.load(f)
+
+
+# The label patterns of the baseline extract_labels(), in its order.
+OLD_LABEL_PATTERNS = {
+    r"\(([a-z]{1,3})\).*": "lower",
+    r"\(([\d]{1,2})\).*": "arabic",
+    r"\(([A-Z]{1,3})\).*": "capital",
+    r"\((M{0,4}(CM|CD|D?C{0,3})(XC|XL|L?X{0,3})(IX|IV|V?I{0,3}))\).*": "roman",
+    r"\((m{0,4}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3}))\).*": "romanette",
+}
+OLD_LABEL_TEXT = r"\((.{1,5})\)(.*)"
+
+
+def old_classify(line):
+    label_types = [label_type for pattern, label_type in OLD_LABEL_PATTERNS.items() if re.match(pattern, line)]
+    match = re.match(OLD_LABEL_TEXT, line)
+    if match is None:
+        return label_types, None, None
+    return label_types, match.group(1), match.group(2)
+
+
+def lines_to_classify():
+    for label_type in BASELINE["labels"]:
+        for label in BASELINE["labels"][label_type]:
+            yield f"({label}) text"
+            yield f"({label})"
+    rng = random.Random(0)
+    for _ in range(20000):
+        yield "".join(rng.choice("()aivxcdlmIVXCDLM0129 .") for _ in range(rng.randint(0, 10)))
+
+
+class Everywhere:
+    """An anchor index with every anchor: the baseline linked every reference,
+    where hyperlink() now links only those to anchors that exist."""
+
+    def __contains__(self, anchor):
+        return True
+
+
+def generated_cites(lines):
+    """The cite of each provision of a generated statute, as intended."""
+    cites = []
+    for kind, level, text in lines:
+        if kind == "section":
+            section = text.rstrip(".")
+            labels = []
+        elif kind == "provision":
+            del labels[level:]
+            for label in re.match(r"(?:\(\w+\) ?)+", text).group().split():
+                labels.append(label)
+                cites.append(section + "".join(labels))
+    return cites
+
+
+class ClassifierTest(unittest.TestCase):
+    def test_classifier_agrees_with_the_old_patterns(self):
+        for line in lines_to_classify():
+            with self.subTest(line=line):
+                label_types, label, text = LINE_CLASSIFIER.classify(line)
+                self.assertEqual((label_types, label, text), old_classify(line))
+
+
+class LabelsTest(unittest.TestCase):
+    def test_tables_are_the_old_ones(self):
+        for label_type, table in BASELINE["labels"].items():
+            with self.subTest(label_type=label_type):
+                self.assertEqual(list(server.get_labels(label_type)), table)
+                for ordinal, label in enumerate(table):
+                    self.assertEqual(LABELS.label(label_type, ordinal), label)
+                    self.assertEqual(LABELS.ordinal(label_type, label), ordinal)
+
+
+class PipelineTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_indent_and_hyperlink_agree_with_the_baseline(self):
+        for knobs in CASES:
+            name = case_name(knobs)
+            expected = BASELINE["cases"][name]
+            with self.subTest(case=name):
+                html_path, txt_path, law_info = case_files(self.directory.name, knobs)
+                with open(html_path, encoding="utf-8") as f:
+                    indented = server.indent_statute(server.filter_html(f.read()), law_info)
+                self.assertEqual(digest(indented), expected["indent_statute"])
+                indented_txt = server.indent_statute(server.filter_txt(txt_path, law_info), law_info)
+                self.assertEqual(digest(indented_txt), expected["indent_statute_txt"])
+                hyperlinked = server.hyperlink(indented, law_info, anchors=Everywhere())
+                self.assertEqual(digest("".join(hyperlinked)), expected["hyperlink"])
+
+    def test_colliding_labels_get_their_intended_cites(self):
+        for seed in range(20):
+            for knobs in ({"collisions": 0.6, "subsections": 0.3}, {"collisions": 0.3, "depth": 5}):
+                with self.subTest(seed=seed, **knobs):
+                    lines = list(generate.Generator(seed=seed, **knobs).statute(3))
+                    indented = server.indent_statute(
+                        server.filter_html(generate.to_html(lines)), generate.law_info()
+                    )
+                    cites = [cite for (style, cite, _, _, _) in indented if style == "TEXT"]
+                    self.assertEqual(cites, generated_cites(lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
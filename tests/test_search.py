@@ -0,0 +1,93 @@
+"""Full-text search over indented statutes.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from search import SearchIndex  # noqa: E402
+
+
+# indent_statute() output: (style, cite, depth, label, text)
+CCPA = [
+    ("NONE", "", 0, "", "California Consumer Privacy Act"),
+    ("LAW_HEADING", "1798.100", 1, "", "1798.100."),
+    ("TEXT", "1798.100(a)", 1, "a", "A consumer shall have the right to request that a business disclose information."),
+    ("TEXT", "1798.100(b)", 1, "b", "A business shall not sell the personal information of a consumer."),
+    ("NONE", "", 1, "", "Information sold or shared."),
+    ("LAW_HEADING", "1798.140", 1, "", "1798.140."),
+    ("TEXT", "1798.140(v)", 1, "v", "Personal information means personal, or personal household, data."),
+]
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.index = SearchIndex(self.directory)
+        self.index.add_document("ccpa", CCPA)
+
+    def anchors(self, query):
+        return sorted(hit.anchor for hit in self.index.search(query))
+
+    def test_words_must_all_match(self):
+        self.assertEqual(self.anchors("consumer"), ["", "1798.100(a)", "1798.100(b)"])
+        self.assertEqual(self.anchors("Business CONSUMER"), ["1798.100(a)", "1798.100(b)"])
+        self.assertEqual(self.anchors("consumer household"), [])
+
+    def test_phrases_match_in_order(self):
+        self.assertEqual(self.anchors('"personal information"'), ["1798.100(b)", "1798.140(v)"])
+        self.assertEqual(self.anchors('"sell the personal" consumer'), ["1798.100(b)"])
+        self.assertEqual(self.anchors('"information personal"'), [])
+
+    def test_prefixes(self):
+        self.assertEqual(self.anchors("disclos*"), ["1798.100(a)"])
+        # Unlabeled text counts towards the anchor before it.
+        self.assertEqual(self.anchors("sol*"), ["1798.100(b)"])
+        self.assertEqual(self.anchors("sh*"), ["1798.100(a)", "1798.100(b)"])
+
+    def test_hits_are_ranked(self):
+        hits = self.index.search("personal")
+        self.assertEqual([hit.anchor for hit in hits], ["1798.140(v)", "1798.100(b)"])
+        self.assertGreater(hits[0].score, hits[1].score)
+        self.assertEqual(hits[0].text, "(v) Personal information means personal, or personal household, data.")
+        self.assertEqual(len(self.index.search("personal", limit=1)), 1)
+
+    def test_hits_link_to_their_anchor(self):
+        [hit] = self.index.search("disclose")
+        self.assertEqual(hit.link, "ccpa.html#1798.100(a)")
+        [hit] = self.index.search("privacy")
+        self.assertEqual((hit.anchor, hit.link), ("", hit.href))
+
+    def test_an_unchanged_document_is_not_indexed_again(self):
+        self.assertFalse(self.index.add_document("ccpa", CCPA))
+        # The index is read back from its files.
+        index = SearchIndex(self.directory)
+        self.assertFalse(index.add_document("ccpa", list(CCPA)))
+        self.assertEqual([hit.anchor for hit in index.search("disclose")], ["1798.100(a)"])
+
+        changed = CCPA[:2] + [("TEXT", "1798.100(a)", 1, "a", "A consumer may opt out.")]
+        self.assertTrue(index.add_document("ccpa", changed))
+        self.assertEqual(index.search("disclose"), [])
+        self.assertEqual([hit.anchor for hit in index.search("opt out")], ["1798.100(a)"])
+
+    def test_documents_are_searched_together(self):
+        self.index.add_document("gdpr", [("TEXT", "4(1)", 1, "1", "Personal data means any information.")], href="gdpr/")
+        self.assertEqual(self.index.documents(), ["ccpa", "gdpr"])
+        self.assertEqual(
+            [hit.link for hit in self.index.search("personal information")],
+            ["ccpa.html#1798.140(v)", "gdpr/#4(1)", "ccpa.html#1798.100(b)"],
+        )
+        self.assertTrue(self.index.remove_document("gdpr"))
+        self.assertEqual([hit.document for hit in self.index.search("data")], ["ccpa"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Sharded rendering agrees with rendering the whole statute.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+import shard  # noqa: E402
+
+
+TEMPLATE = "index_template_general.html"
+
+
+class ShardTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        # The templates are found relative to the working directory.
+        os.chdir(ROOT)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def test_shards_render_like_the_whole_statute(self):
+        for seed in range(3):
+            knobs = {"collisions": 0.4, "subsections": 0.3, "term_density": 0.2, "seed": seed}
+            html_path, txt_path, law_info = generate.generate(
+                os.path.join(self.directory, f"statute{seed}"), 8, **knobs
+            )
+            with open(html_path, encoding="utf-8") as f:
+                from_html = server.filter_html(f.read())
+            from_txt = server.filter_txt(txt_path, law_info)
+            for source, filtered in (("html", from_html), ("txt", from_txt)):
+                with self.subTest(seed=seed, source=source):
+                    self.assertGreater(len(list(shard.shard_statute(filtered, 10))), 2)
+                    self.assertEqual(
+                        shard.render_statute(filtered, law_info, TEMPLATE, shard_size=10, workers=2),
+                        server.render_statute(filtered, law_info, TEMPLATE),
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
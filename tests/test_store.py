@@ -0,0 +1,162 @@
+"""Resuming from the stage store, and collecting its garbage.
+
+    python -m unittest discover tests
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+import store  # noqa: E402
+from crossref import AnchorIndex, CorpusIndex  # noqa: E402
+
+
+TEMPLATE = "index_template_general.html"
+URL = "https://leginfo.legislature.ca.gov/faces/codes_displayText.xhtml?lawCode=CIV&article=1"
+
+
+class Site:
+    """Stands in for an HTTPCache, counting the pages fetched."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetched = []
+
+    def get(self, url):
+        self.fetched.append(url)
+        return self.pages[url]
+
+
+class StageStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        # The templates are found relative to the working directory.
+        os.chdir(ROOT)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "stages.sqlite")
+        self.law_info = generate.law_info()
+        self.page = generate.to_html(generate.Generator(seed=1).statute(3))
+        self.site = Site({URL: self.page})
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def open(self):
+        """The store, as a new process would open it."""
+        stages = store.StageStore(self.path)
+        self.addCleanup(stages.close)
+        return stages
+
+    def format(self, law_info=None, corpus=None, max_age=None):
+        """store.format_statute() of URL in a new store object. Returns the
+        html and how many times each stage ran."""
+        stages = self.open()
+        counts = {}
+        patches = [
+            mock.patch.object(server, name, wraps=getattr(server, name))
+            for name in ("filter_source", "indent_statute", "hyperlink")
+        ]
+        for patch in patches:
+            patch.start()
+        try:
+            fetched = len(self.site.fetched)
+            html = store.format_statute(
+                URL, law_info or self.law_info, TEMPLATE, stages, self.site, corpus, max_age
+            )
+            counts["fetch"] = len(self.site.fetched) - fetched
+            for patch, name in zip(patches, ("filter", "indent", "hyperlink")):
+                counts[name] = getattr(server, patch.attribute).call_count
+        finally:
+            for patch in patches:
+                patch.stop()
+        return html, counts
+
+    def test_first_time_everything_runs(self):
+        html, counts = self.format()
+        self.assertEqual(counts, {"fetch": 1, "filter": 1, "indent": 1, "hyperlink": 1})
+        self.assertEqual(html, server.format_statute(URL, self.law_info, TEMPLATE, "", http_cache=self.site))
+
+    def test_resumes_from_stored_html(self):
+        expected, _ = self.format()
+        html, counts = self.format()
+        self.assertEqual(counts, {"fetch": 0, "filter": 0, "indent": 0, "hyperlink": 0})
+        self.assertEqual(html, expected)
+
+    def test_resumes_from_stored_indentation(self):
+        self.format()
+        # A corpus changes the links, not the indentation.
+        corpus = CorpusIndex()
+        corpus.add("other.html", AnchorIndex(["1798.150"]))
+        html, counts = self.format(corpus=corpus)
+        self.assertEqual(counts, {"fetch": 0, "filter": 0, "indent": 0, "hyperlink": 1})
+        self.assertEqual(
+            html, server.format_statute(URL, self.law_info, TEMPLATE, "", http_cache=self.site, corpus=corpus)
+        )
+
+    def test_resumes_from_stored_page(self):
+        self.format()
+        law_info = dict(self.law_info, defined_subterms={"entity": "#1798.140(j)"})
+        html, counts = self.format(law_info=law_info)
+        self.assertEqual(counts, {"fetch": 0, "filter": 1, "indent": 1, "hyperlink": 1})
+        self.assertEqual(html, server.format_statute(URL, law_info, TEMPLATE, "", http_cache=self.site))
+
+    def test_stale_page_is_fetched_again(self):
+        self.format()
+        self.site.pages[URL] = generate.to_html(generate.Generator(seed=2).statute(3))
+        html, counts = self.format(max_age=0)
+        self.assertEqual(counts, {"fetch": 1, "filter": 1, "indent": 1, "hyperlink": 1})
+        self.assertEqual(html, server.format_statute(URL, self.law_info, TEMPLATE, "", http_cache=self.site))
+
+    def test_reading_stored_html_writes_only_the_use(self):
+        self.format()
+        stages = self.open()
+        with mock.patch.object(stages, "put_page") as put_page, mock.patch.object(stages, "put_stages") as put_stages:
+            store.format_statute(URL, self.law_info, TEMPLATE, stages, self.site)
+        put_page.assert_not_called()
+        put_stages.assert_not_called()
+
+    def test_gc_deletes_what_no_source_refers_to(self):
+        self.format()
+        stages = self.open()
+        other = generate.to_html(generate.Generator(seed=3).statute(1))
+        store.render_source(stages, "other.html", other, self.law_info, TEMPLATE)
+        self.assertEqual(stages.stats()["pages"], 2)
+        self.assertEqual(stages.stats()["stages"], 6)
+
+        # The page changes: the old one and its stages are garbage.
+        self.site.pages[URL] = generate.to_html(generate.Generator(seed=2).statute(3))
+        self.format(max_age=0)
+        self.assertEqual(stages.gc(), {"sources": 0, "pages": 1, "stages": 3})
+        self.assertEqual(self.format()[1], {"fetch": 0, "filter": 0, "indent": 0, "hyperlink": 0})
+
+        # Nothing used lately: everything goes.
+        self.assertEqual(stages.gc(max_age=-1, vacuum=True), {"sources": 2, "pages": 2, "stages": 6})
+        stats = stages.stats()
+        self.assertEqual((stats["sources"], stats["pages"], stats["stages"]), (0, 0, 0))
+
+    def test_version_1_pages_count_as_stale(self):
+        db = sqlite3.connect(self.path)
+        db.executescript(
+            "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "INSERT INTO meta VALUES ('version', '1');"
+            "CREATE TABLE sources (source TEXT PRIMARY KEY, hash TEXT NOT NULL, used REAL NOT NULL) WITHOUT ROWID;"
+            "INSERT INTO sources VALUES ('page.html', 'abc', 0);"
+        )
+        db.close()
+        stages = self.open()
+        self.assertIsNone(stages.source_page("page.html", max_age=3600))
+        self.assertEqual(stages.source_page("page.html"), "abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
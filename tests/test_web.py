@@ -0,0 +1,341 @@
+"""The web service, end to end over real sockets.
+
+    python -m unittest discover tests
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import http.server
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import generate  # noqa: E402
+import server  # noqa: E402
+import web  # noqa: E402
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def do_GET(self):
+        self.server.fetched.append(self.path)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageServer:
+    """Serves the files in `directory` on localhost, from a thread, and
+    keeps the paths fetched."""
+
+    def __init__(self, directory):
+        handler = functools.partial(QuietHandler, directory=directory)
+        self.httpd = http.server.ThreadingHTTPServer(("localhost", 0), handler)
+        self.httpd.fetched = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def fetched(self):
+        return self.httpd.fetched
+
+    def url(self, name):
+        return f"http://localhost:{self.httpd.server_address[1]}/{name}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class ServiceThread:
+    """Runs an HTTPServer for `service` on its own event loop, in a thread."""
+
+    def __init__(self, service):
+        with socket.socket() as probe:
+            probe.bind(("localhost", 0))
+            self.port = probe.getsockname()[1]
+        self.errors = []
+        self.loop = asyncio.new_event_loop()
+        # Failures asyncio would log are collected instead.
+        self.loop.set_exception_handler(lambda loop, context: self.errors.append(context))
+        self.serving = self.loop.create_task(web.HTTPServer(service).serve("localhost", self.port))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._wait_until_listening()
+
+    def _run(self):
+        try:
+            self.loop.run_until_complete(self.serving)
+        except asyncio.CancelledError:
+            pass
+
+    def _wait_until_listening(self):
+        for _ in range(100):
+            try:
+                socket.create_connection(("localhost", self.port), timeout=1).close()
+                return
+            except ConnectionRefusedError:
+                threading.Event().wait(0.05)
+        raise RuntimeError("the server didn't start")
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.serving.cancel)
+        self.thread.join(10)
+        self.loop.close()
+
+
+def request(port, method, body=b"", timeout=30):
+    """Sends a request and reads the response to EOF, which only comes if
+    every process holding the connection has closed it. Returns (status
+    line, headers, body)."""
+    with socket.create_connection(("localhost", port), timeout=timeout) as client:
+        client.sendall(
+            f"{method} / HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+            + body
+        )
+        response = b""
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            response += data
+    head, _, body = response.partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in header_lines)
+    return status_line, headers, body
+
+
+def dechunk(body):
+    """The content of a chunked body, and whether it had the final chunk."""
+    content = b""
+    while body:
+        size, _, body = body.partition(b"\r\n")
+        size = int(size, 16)
+        if size == 0:
+            return content, True
+        content += body[:size]
+        body = body[size + 2:]
+    return content, False
+
+
+def timed_out(status, body):
+    """Whether the response is for a statute that ran out of time: a 504,
+    or, if the head of the page had already been sent, a 200 without the
+    final chunk."""
+    if status == "HTTP/1.1 504 Gateway Timeout":
+        return True
+    return status == "HTTP/1.1 200 OK" and not dechunk(body)[1]
+
+
+def post_body(url):
+    return urllib.parse.urlencode({"name": url}).encode()
+
+
+class Requests:
+    """Sends requests from threads. result() waits for the responses, in
+    the order the requests were sent."""
+
+    def __init__(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(8)
+        self.futures = []
+
+    def send(self, *args):
+        self.futures.append(self.executor.submit(request, *args))
+
+    def result(self):
+        try:
+            return [future.result() for future in self.futures]
+        finally:
+            self.executor.shutdown()
+
+
+class StatuteServiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cwd = os.getcwd()
+        # The templates are found relative to the working directory.
+        os.chdir(ROOT)
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.html_path, _, cls.law_info = generate.generate(os.path.join(cls.directory.name, "statute"), 40)
+        # Takes a couple of seconds to format.
+        generate.generate(os.path.join(cls.directory.name, "big"), 600)
+        cls.pages = PageServer(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pages.close()
+        cls.directory.cleanup()
+        os.chdir(cls.cwd)
+
+    def setUp(self):
+        self.pages.fetched.clear()
+
+    def serve(self, **kwargs):
+        """A new service, and its port. Its workers haven't run anything."""
+        kwargs.setdefault("workers", 2)
+        kwargs.setdefault("law_info", self.law_info)
+        service = web.StatuteService(allowed_hosts=("localhost",), http_cache=None, render_cache=None, **kwargs)
+        self.addCleanup(service.close)
+        running = ServiceThread(service)
+        self.addCleanup(running.close)
+        return running.port
+
+    def test_statute_is_streamed_and_the_connection_closed(self):
+        port = self.serve(chunk_size=1024)
+        status, headers, body = request(port, "POST", post_body(self.pages.url("statute.html")))
+
+        self.assertEqual(status, "HTTP/1.1 200 OK")
+        self.assertEqual(headers["transfer-encoding"], "chunked")
+        content, complete = dechunk(body)
+        self.assertTrue(complete)
+        expected = server.format_statute(
+            self.html_path, self.law_info, web.STATUTE_TEMPLATE, "", http_cache=None, render_cache=None
+        )
+        self.assertEqual(content.decode("utf-8"), expected)
+
+    def test_a_timed_out_conversion_keeps_its_slot_until_it_finishes(self):
+        port = self.serve(workers=1, queue_size=0, request_timeout=1)
+        status, _, body = request(port, "POST", post_body(self.pages.url("big.html")))
+        self.assertTrue(timed_out(status, body))
+
+        # The worker is still busy with the big statute.
+        status, headers, _ = request(port, "POST", post_body(self.pages.url("statute.html")))
+        self.assertEqual(status, "HTTP/1.1 503 Service Unavailable")
+        self.assertEqual(headers["retry-after"], "30")
+
+        deadline = time.monotonic() + 30
+        while status.endswith("503 Service Unavailable") and time.monotonic() < deadline:
+            time.sleep(0.2)
+            status, _, _ = request(port, "POST", post_body(self.pages.url("statute.html")))
+        self.assertEqual(status, "HTTP/1.1 200 OK")
+
+    def test_a_restarted_service_uses_its_store(self):
+        path = os.path.join(self.directory.name, "stages.sqlite")
+        expected = None
+        for _ in range(2):
+            port = self.serve(store=path)
+            status, _, body = request(port, "POST", post_body(self.pages.url("statute.html")))
+            self.assertEqual(status, "HTTP/1.1 200 OK")
+            content, complete = dechunk(body)
+            self.assertTrue(complete)
+            expected = expected or content
+            self.assertEqual(content, expected)
+            self.doCleanups()
+        self.assertEqual(self.pages.fetched, ["/statute.html"])
+
+    def test_identical_requests_share_one_conversion(self):
+        # Room for a single conversion: a second one would be turned away.
+        port = self.serve(workers=1, queue_size=0)
+        pending = Requests()
+        for _ in range(4):
+            pending.send(port, "POST", post_body(self.pages.url("big.html")))
+        responses = pending.result()
+
+        contents = set()
+        for status, _, body in responses:
+            self.assertEqual(status, "HTTP/1.1 200 OK")
+            content, complete = dechunk(body)
+            self.assertTrue(complete)
+            contents.add(content)
+        self.assertEqual(len(contents), 1)
+        self.assertEqual(self.pages.fetched.count("/big.html"), 1)
+
+    def test_a_busy_service_turns_requests_away(self):
+        port = self.serve(workers=1, queue_size=0)
+        pending = Requests()
+        pending.send(port, "POST", post_body(self.pages.url("big.html")))
+        # Admitted once its page is fetched.
+        deadline = time.monotonic() + 10
+        while "/big.html" not in self.pages.fetched and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        status, headers, body = request(port, "POST", post_body(self.pages.url("statute.html")))
+        self.assertEqual(status, "HTTP/1.1 503 Service Unavailable")
+        self.assertEqual(headers["retry-after"], "30")
+        self.assertIn(b"busy", body)
+
+        [(status, _, body)] = pending.result()
+        self.assertEqual(status, "HTTP/1.1 200 OK")
+        self.assertTrue(dechunk(body)[1])
+
+    def test_a_slow_statute_times_out(self):
+        port = self.serve(request_timeout=0.5)
+        status, _, body = request(port, "POST", post_body(self.pages.url("big.html")))
+        self.assertTrue(timed_out(status, body))
+
+    def test_form_and_errors_get_a_length(self):
+        port = self.serve()
+        status, headers, body = request(port, "GET")
+        self.assertEqual(status, "HTTP/1.1 200 OK")
+        self.assertEqual(int(headers["content-length"]), len(body))
+
+        status, _, body = request(port, "POST", post_body("http://example.com/statute.html"))
+        self.assertEqual(status, "HTTP/1.1 400 Bad Request")
+        self.assertIn(b"Leginfo", body)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_a_caller_counts_from_when_it_joins(self):
+        computations = []
+
+        async def compute():
+            computations.append(True)
+            await asyncio.sleep(0.05)
+            return "statute"
+
+        async def scenario():
+            flights = web.SingleFlight()
+            leader = asyncio.ensure_future(flights.do("key", compute))
+            await asyncio.sleep(0)
+            # Joins, but doesn't wait yet...
+            call = flights.start("key", compute)
+            # ...when the only caller waiting gives up.
+            leader.cancel()
+            await asyncio.sleep(0)
+            return await flights.wait("key", call), len(flights)
+
+        self.assertEqual(asyncio.run(scenario()), ("statute", 0))
+        self.assertEqual(len(computations), 1)
+
+
+class FailingService:
+    """Sends one chunk of a statute, then fails with `error`."""
+
+    def __init__(self, error):
+        self.error = error
+
+    async def handle(self, method, target, body):
+        async def chunks():
+            yield "<html>"
+            raise self.error
+
+        return 200, chunks()
+
+
+class RespondChunkedTest(unittest.TestCase):
+    def check_incomplete(self, error):
+        running = ServiceThread(FailingService(error))
+        self.addCleanup(running.close)
+        status, _, body = request(running.port, "POST")
+        self.assertEqual(status, "HTTP/1.1 200 OK")
+        self.assertEqual(dechunk(body), (b"<html>", False))
+
+    def test_timeout_part_way_leaves_out_the_final_chunk(self):
+        self.check_incomplete(web.RequestError(504, "That statute took too long to format."))
+
+    def test_any_failure_part_way_leaves_out_the_final_chunk(self):
+        self.check_incomplete(ValueError("a bug"))
+
+
+if __name__ == "__main__":
+    unittest.main()
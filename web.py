@@ -0,0 +1,694 @@
+"""The Indent California web service.
+
+A small HTTP/1.1 server on asyncio (no dependencies beyond the pipeline's):
+
+    GET  /   the form in templates/hello.html
+    POST /   name=<leginfo url>: the formatted statute, or the form again
+             with an error message
+
+Pages are fetched on a pool of threads, and parsed on a pool of processes,
+so neither blocks the event loop. main() fetches through an on-disk
+http_cache.HTTPCache and keeps rendered statutes in a RenderCache; a
+StatuteService only uses the caches it is given. At most `workers`
+statutes are converted at once; up to `queue_size` more requests wait for a
+slot, and beyond that requests are turned away with a 503 right away rather
+than piling up. Each request gets a 504 if its statute isn't ready within
+`request_timeout` seconds, so one huge code can't hold up everyone else.
+
+Concurrent requests for the same statute (the same URL, once normalized,
+with the same law_info and template) share one conversion; see SingleFlight.
+With `store`, the path of a store.StageStore, pages and parses are kept on
+disk, so a restarted service doesn't fetch or parse every statute again;
+pages stored more than `store_max_age` seconds ago are fetched again.
+
+Statutes are streamed to the browser with chunked transfer encoding: the
+worker sends the head of the template as soon as the page is filtered (so
+the browser can start on the stylesheet and title), then the provisions in
+chunks of about `chunk_size` characters as they are linked, then the tail.
+The body can only start once the whole statute is indented, since cites are
+linked only to anchors that exist. Requests sharing a conversion each get
+every chunk from the first; see Rendering. Statutes from the render cache,
+and every statute of a service with a `store` (whose conversions go through
+store.convert(), which resumes from stored stages rather than streaming),
+are sent whole once they are ready.
+
+    PORT=3000 python server.py
+"""
+
+import asyncio
+import concurrent.futures
+import html
+import multiprocessing
+import os
+import re
+import urllib.parse
+import weakref
+
+import server
+from http_cache import HTTPCache
+from render_cache import RenderCache, law_info_digest
+from template import load_template
+
+
+FORM_TEMPLATE = "hello.html"
+STATUTE_TEMPLATE = "index_template_general.html"
+
+ALLOWED_HOSTS = ("leginfo.legislature.ca.gov",)
+
+CHUNK_SIZE = 64 * 2**10
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class RequestError(Exception):
+    """A request that gets an error status instead of a statute."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# The jinja constructs used by hello.html, rendered by FormPage.
+FORM_CONSTRUCTS = re.compile(
+    r"(?P<messages>{%\s*with messages = get_flashed_messages\(.*?\)\s*%}.*?{%\s*endwith\s*%})"
+    r"|(?P<csrf>{{\s*form\.csrf\s*}})"
+    r"|(?P<name>{{\s*form\.name\s*}})"
+    r"|(?P<cited>{%\s*if cited\s*%}.*?{%\s*endif\s*%})",
+    re.DOTALL,
+)
+
+NAME_INPUT = '<input id="name" name="name" type="url" size="100" required>'
+
+
+class FormPage:
+    """hello.html, split once at its jinja constructs."""
+
+    def __init__(self, text):
+        self.pieces = []
+        position = 0
+        for match in FORM_CONSTRUCTS.finditer(text):
+            self.pieces.append(text[position:match.start()])
+            self.pieces.append((match.lastgroup,))
+            position = match.end()
+        self.pieces.append(text[position:])
+
+    def render(self, messages=(), cited=""):
+        parts = []
+        for piece in self.pieces:
+            if isinstance(piece, str):
+                parts.append(piece)
+            elif piece[0] == "messages" and messages:
+                parts.append("<ul>\n")
+                for message in messages:
+                    parts.append(f"  <li>{html.escape(message)}</li>\n")
+                parts.append("</ul>")
+            elif piece[0] == "name":
+                parts.append(NAME_INPUT)
+            elif piece[0] == "cited":
+                parts.append(cited)
+        return "".join(parts)
+
+
+def load_form_page():
+    with open(os.path.join("templates", FORM_TEMPLATE), encoding="utf-8") as f:
+        return FormPage(f.read())
+
+
+class ChunkSink:
+    """A file-like sink that puts what is written on a queue, in chunks of
+    at least `chunk_size` characters (except for flush())."""
+
+    def __init__(self, chunks, chunk_size):
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self._buffer = []
+        self._size = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.chunks.put("".join(self._buffer))
+            self._buffer = []
+            self._size = 0
+
+
+def stream_convert(html_content, law_info, template, chunks, chunk_size=CHUNK_SIZE):
+    """Runs in a worker process: formats the statute, putting the html on
+    the queue `chunks` as it is produced, then None."""
+    try:
+        filtered_statute = list(server.filter_html(html_content))
+        title = server.statute_title(filtered_statute, law_info)
+        compiled = load_template(template)
+        sink = ChunkSink(chunks, chunk_size)
+
+        compiled.write_head(sink, title)
+        sink.flush()
+
+        indented = server.indent_statute(filtered_statute, law_info)
+        for line in server.iter_hyperlink(indented, law_info):
+            sink.write(line)
+        compiled.write_tail(sink, title)
+        sink.flush()
+    finally:
+        chunks.put(None)
+
+
+def check_url(url, allowed_hosts=ALLOWED_HOSTS):
+    """Only statute pages are fetched, not whatever the form is given."""
+    parts = urllib.parse.urlsplit(url.strip())
+    if parts.scheme not in ("http", "https") or parts.hostname not in allowed_hosts:
+        raise RequestError(400, "Please enter a California Leginfo statute URL.")
+    return urllib.parse.urlunsplit(parts)
+
+
+def normalize_url(url):
+    """`url` in a canonical form, for telling when two requests are for the
+    same page: lowercase scheme and host, no fragment, sorted query."""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.urlencode(
+        sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+    )
+    return urllib.parse.urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, "")
+    )
+
+
+class SingleFlight:
+    """Runs one computation per key at a time, however many callers ask.
+
+    The first caller for a key starts the computation; callers that arrive
+    while it is running wait for the same result, or the same exception. A
+    caller that is cancelled (e.g. its timeout expired or its client went
+    away) stops waiting without disturbing the others, and when the last one
+    leaves the computation itself is cancelled. Finished computations aren't
+    kept: caching results is the render cache's job.
+    """
+
+    def __init__(self):
+        # key -> [task, number of callers waiting for it]
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key, compute):
+        """The result of `compute()`, a coroutine function, for `key`."""
+        return await self.wait(key, self.start(key, compute))
+
+    def start(self, key, compute):
+        """Joins the computation for `key`, starting `compute()` if there is
+        none. Returns the call; its task is call[0]. The caller counts as
+        waiting from now on, until it leaves: wait() leaves when it is done,
+        and a caller that waits some other way must call leave() itself."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = [asyncio.ensure_future(compute()), 0]
+            call[0].add_done_callback(lambda task: self._forget(key, call))
+        # Counted now, not once the caller gets round to waiting, so that
+        # another caller leaving in between can't cancel the computation.
+        call[1] += 1
+        return call
+
+    async def wait(self, key, call):
+        """The result of the `call` from start()."""
+        try:
+            # shield(): cancelling one caller mustn't cancel the task.
+            return await asyncio.shield(call[0])
+        finally:
+            self.leave(key, call)
+
+    def leave(self, key, call):
+        """Stops waiting for the `call` from start()."""
+        task = call[0]
+        call[1] -= 1
+        if call[1] == 0 and not task.done():
+            # Nobody is left waiting; later callers start afresh.
+            self._forget(key, call)
+            task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class Rendering:
+    """The html of one statute, in chunks as it is rendered. Every request
+    sharing the conversion follows it from the first chunk."""
+
+    def __init__(self):
+        self.chunks = []
+        self._added = asyncio.Event()
+
+    def add(self, chunk):
+        self.chunks.append(chunk)
+        # Wakes everyone following; the next chunk gets a new event.
+        self._added.set()
+        self._added = asyncio.Event()
+
+    async def follow(self, caller):
+        """Yields the chunks until `caller`, a future of the conversion's
+        result, is done, then raises its exception if it has one. A
+        statute that wasn't streamed (e.g. from the render cache) is yielded
+        whole at the end."""
+        i = 0
+        while True:
+            added = self._added
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if caller.done():
+                statute = caller.result()
+                if not self.chunks:
+                    yield statute
+                return
+            waiting = asyncio.ensure_future(added.wait())
+            try:
+                await asyncio.wait([waiting, caller], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiting.cancel()
+
+
+class Admission:
+    """A conversion's place among the ones admitted, and its slot. Both are
+    given back (by calling `release`) only once the conversion and all the
+    work it handed to the pools have finished: a request that times out or
+    goes away stops waiting, but a page being fetched or parsed still holds
+    a thread or a worker until it is done."""
+
+    def __init__(self, release):
+        self._release = release
+        self._loop = asyncio.get_running_loop()
+        # The conversion itself, and each unfinished piece of work.
+        self._holds = 1
+
+    def submit(self, executor, fn, *args):
+        """executor.submit(), held until it finishes. Returns the
+        concurrent.futures.Future."""
+        future = executor.submit(fn, *args)
+        self._holds += 1
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        # Called on whichever thread finished the work.
+        try:
+            self._loop.call_soon_threadsafe(self.done)
+        except RuntimeError:
+            # The loop is closed, so nobody is left to admit.
+            pass
+
+    def done(self):
+        self._holds -= 1
+        if self._holds == 0:
+            self._release()
+
+
+async def prepend(first, rest):
+    """The async iterator `rest` with `first` in front."""
+    try:
+        yield first
+        async for item in rest:
+            yield item
+    finally:
+        await rest.aclose()
+
+
+class StatuteService:
+    def __init__(
+        self,
+        workers=None,
+        fetchers=8,
+        queue_size=16,
+        request_timeout=60,
+        law_info=server.default_law_info,
+        template=STATUTE_TEMPLATE,
+        http_cache=None,
+        render_cache=None,
+        store=None,
+        store_max_age=3600,
+        chunk_size=CHUNK_SIZE,
+        allowed_hosts=ALLOWED_HOSTS,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.request_timeout = request_timeout
+        self.law_info = law_info
+        self.template = template
+        self.http_cache = http_cache
+        self.render_cache = render_cache
+        # The path of a store.StageStore, which the workers open, so that
+        # parses outlive the process.
+        self.store = store
+        # Pages stored longer ago than this are fetched again.
+        self.store_max_age = store_max_age
+        self.chunk_size = chunk_size
+        self.allowed_hosts = allowed_hosts
+
+        self.parsers = concurrent.futures.ProcessPoolExecutor(self.workers)
+        self.network = concurrent.futures.ThreadPoolExecutor(fetchers)
+        # Threads relaying chunks from the workers, one per conversion.
+        self.relays = concurrent.futures.ThreadPoolExecutor(self.workers + queue_size)
+        self.form_page = load_form_page()
+
+        self._slots = None
+        self._admitted = 0
+        self._law_info_digest = law_info_digest(law_info)
+        self.flights = SingleFlight()
+        # flight task -> its Rendering
+        self._renderings = weakref.WeakKeyDictionary()
+        # Owns the queues the workers send chunks back on. Started here,
+        # before there are other threads, since it is a forked process.
+        self.manager = multiprocessing.Manager()
+        # The pool forks its workers when it is first given work. Forked
+        # later, after the server is listening, they would inherit its
+        # sockets: clients would never see their connection close, and the
+        # port would stay bound. So they are started now.
+        concurrent.futures.wait([self.parsers.submit(os.getpid) for _ in range(self.workers)])
+
+    def close(self):
+        """Waits for the conversions already given to the workers."""
+        self.network.shutdown(wait=False)
+        self.relays.shutdown(wait=False)
+        # Not shutdown(wait=False): on Python 3.8 it can leave the workers
+        # running, and the interpreter waiting for them at exit.
+        self.parsers.shutdown()
+        self.manager.shutdown()
+
+    async def stream_url(self, url):
+        """Yields the formatted statute at `url` in chunks, as it is rendered.
+        Raises RequestError: before the first chunk if the url isn't allowed,
+        the service is busy (503), the page can't be fetched or formatted, or
+        it takes longer than `request_timeout` (504); after it, if the
+        statute runs out of time part way."""
+
+        url = check_url(url, self.allowed_hosts)
+        key = (normalize_url(url), self._law_info_digest, self.template)
+
+        rendering = Rendering()
+        call = self.flights.start(key, lambda: self._admit(url, rendering))
+        try:
+            rendering = self._renderings.setdefault(call[0], rendering)
+            # Cancelling this request's view of the conversion leaves the
+            # conversion alone, for the other requests sharing it.
+            caller = asyncio.shield(call[0])
+            timed_out = []
+
+            def expire():
+                timed_out.append(True)
+                caller.cancel()
+
+            timer = asyncio.get_running_loop().call_later(self.request_timeout, expire)
+            try:
+                async for chunk in rendering.follow(caller):
+                    yield chunk
+            except asyncio.CancelledError:
+                if not timed_out:
+                    raise
+                raise RequestError(504, "That statute took too long to format.") from None
+            finally:
+                timer.cancel()
+                caller.cancel()
+        finally:
+            self.flights.leave(key, call)
+
+    async def _admit(self, url, rendering):
+        # Backpressure: a bounded number of conversions run or wait at once.
+        # Requests sharing a conversion count once.
+        if self._admitted >= self.workers + self.queue_size:
+            raise RequestError(503, "The server is busy, please try again in a minute.")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        self._admitted += 1
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._admitted -= 1
+            raise
+        admission = Admission(self._release)
+        try:
+            return await self._format(url, rendering, admission)
+        finally:
+            admission.done()
+
+    def _release(self):
+        self._slots.release()
+        self._admitted -= 1
+
+    async def _format(self, url, rendering, admission):
+        stored = False
+        if self.store is not None:
+            stored = await asyncio.wrap_future(admission.submit(self.network, self._stored, url))
+
+        html_content = None
+        key = None
+        if not stored:
+            try:
+                html_content = await asyncio.wrap_future(
+                    admission.submit(self.network, self._fetch, url)
+                )
+            except Exception as e:
+                raise RequestError(502, f"Couldn't fetch that page ({e.__class__.__name__}).") from e
+
+            if self.render_cache is not None:
+                key = self.render_cache.key(
+                    html_content, self.law_info, server.template_version(self.template)
+                )
+                cached = self.render_cache.get(key)
+                if cached is not None:
+                    return cached
+
+        try:
+            if self.store is not None:
+                # Only imported when the service keeps a store.
+                from store import convert as store_convert
+
+                # Without html_content, the worker renders the stored page.
+                # Not streamed: Rendering.follow() sends the statute whole.
+                statute = await asyncio.wrap_future(admission.submit(
+                    self.parsers, store_convert, self.store, url, html_content, self.law_info, self.template
+                ))
+            else:
+                statute = await self._stream(html_content, rendering, admission)
+        except Exception as e:
+            raise RequestError(
+                500, f"Couldn't format that page ({e.__class__.__name__})."
+            ) from e
+
+        if key is not None:
+            self.render_cache.put(key, statute)
+        return statute
+
+    async def _stream(self, html_content, rendering, admission):
+        """stream_convert() in a worker, adding its chunks to `rendering` as
+        they come. Returns the whole statute."""
+
+        chunks = await asyncio.wrap_future(admission.submit(self.relays, self.manager.Queue))
+        converting = admission.submit(
+            self.parsers,
+            stream_convert,
+            html_content,
+            self.law_info,
+            self.template,
+            chunks,
+            self.chunk_size,
+        )
+
+        def release(converting):
+            # If the worker never ran (the conversion was cancelled while
+            # queued, or the pool broke), nothing else would end the relay.
+            if converting.cancelled() or converting.exception() is not None:
+                self.relays.submit(chunks.put, None)
+
+        converting.add_done_callback(release)
+
+        try:
+            while True:
+                chunk = await asyncio.wrap_future(admission.submit(self.relays, chunks.get))
+                if chunk is None:
+                    break
+                rendering.add(chunk)
+        except asyncio.CancelledError:
+            # Only takes back a conversion still queued for a worker.
+            converting.cancel()
+            raise
+        await asyncio.wrap_future(converting)
+        return "".join(rendering.chunks)
+
+    def _stored(self, url):
+        """Whether the store has a page for `url` recent enough to use."""
+        import store
+
+        return store.stored_page(store.open_store(self.store), url, self.store_max_age) is not None
+
+    def _fetch(self, url):
+        return server.read_source(url, self.http_cache)
+
+    async def handle(self, method, target, body):
+        """Returns (status, html) for a request. The html of a statute is an
+        async iterator of chunks."""
+
+        path = urllib.parse.urlsplit(target).path
+        if path != "/":
+            return 404, self.form_page.render(["No such page."])
+
+        if method in ("GET", "HEAD"):
+            return 200, self.form_page.render()
+        if method != "POST":
+            return 405, self.form_page.render([f"{method} isn't supported."])
+
+        form = urllib.parse.parse_qs(body.decode("utf-8", "replace"))
+        url = form.get("name", [""])[0]
+        # Errors before the first chunk still get their own status.
+        chunks = self.stream_url(url)
+        try:
+            first = await chunks.__anext__()
+        except RequestError as e:
+            return e.status, self.form_page.render([e.message])
+        except StopAsyncIteration:
+            return 200, ""
+        return 200, prepend(first, chunks)
+
+
+class HTTPServer:
+    """Just enough HTTP/1.1 for a form: one request per connection."""
+
+    def __init__(self, service, max_body=64 * 2**10, header_timeout=10):
+        self.service = service
+        self.max_body = max_body
+        self.header_timeout = header_timeout
+
+    async def serve(self, host="0.0.0.0", port=3000):
+        listener = await asyncio.start_server(self.handle_connection, host, port)
+        async with listener:
+            await listener.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, target, body = await asyncio.wait_for(
+                    self.read_request(reader), self.header_timeout
+                )
+            except asyncio.TimeoutError:
+                await self.respond(writer, 408, "")
+                return
+            except RequestError as e:
+                await self.respond(writer, e.status, html.escape(e.message))
+                return
+
+            try:
+                status, page = await self.service.handle(method, target, body)
+            except Exception:
+                await self.respond(writer, 500, "")
+                raise
+            await self.respond(writer, status, "" if method == "HEAD" else page)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_request(self, reader):
+        try:
+            request_line = await reader.readline()
+            method, target, _version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise RequestError(400, "Bad request line.") from None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= 100:
+                raise RequestError(400, "Too many headers.")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise RequestError(400, "Bad Content-Length.") from None
+        if length > self.max_body:
+            raise RequestError(413, "Request too large.")
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method.upper(), target, body
+
+    async def respond(self, writer, status, page):
+        """`page` is the html, or an async iterator of chunks of it."""
+        if not isinstance(page, str):
+            await self.respond_chunked(writer, status, page)
+            return
+        content = page.encode("utf-8")
+        writer.write(self.head(status, f"Content-Length: {len(content)}"))
+        writer.write(content)
+        await writer.drain()
+
+    async def respond_chunked(self, writer, status, chunks):
+        """Sends each chunk as it comes, with chunked transfer encoding. If
+        anything fails part way, the connection is closed without the final
+        empty chunk, so the browser knows the page is incomplete."""
+        writer.write(self.head(status, "Transfer-Encoding: chunked"))
+        try:
+            async for chunk in chunks:
+                data = chunk.encode("utf-8")
+                if data:
+                    writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+                    await writer.drain()
+        except Exception as e:
+            # The status is already sent, so there is nothing else to tell
+            # the client. A statute that ran out of time is expected; any
+            # other failure is still reported, by asyncio.
+            if isinstance(e, RequestError):
+                return
+            raise
+        finally:
+            await chunks.aclose()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def head(self, status, length_header):
+        lines = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            "Content-Type: text/html; charset=utf-8",
+            length_header,
+            "Connection: close",
+        ]
+        if status == 503:
+            lines.append("Retry-After: 30")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def main(port=None, **kwargs):
+    """Serves on `port`, or the PORT environment variable (as on Glitch)."""
+    port = port or int(os.environ.get("PORT", 3000))
+    kwargs.setdefault("http_cache", HTTPCache())
+    kwargs.setdefault("render_cache", RenderCache())
+    service = StatuteService(**kwargs)
+    print(f"Serving Indent California on port {port}")
+    try:
+        asyncio.run(HTTPServer(service).serve(port=port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()